@@ -10,11 +10,17 @@ import sys
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from src.models.user import db, User
-from src.main import app
+from src.main import create_app
+from src.utils.schema import upgrade_schema
+
+app = create_app()
 
 def create_default_users():
     """Create default admin and user accounts"""
     with app.app_context():
+        # The app no longer creates the tables itself; make sure they exist
+        upgrade_schema()
+        
         # Check if users already exist
         existing_admin = User.query.filter_by(username='admin').first()
         existing_user = User.query.filter_by(username='user').first()
@@ -0,0 +1,76 @@
+"""Production server settings: ``gunicorn -c gunicorn.conf.py``
+
+Run ``flask --app src.main upgrade-db`` and ``flask --app src.main
+build-assets`` first (and after every upgrade); the server does not
+create or migrate the schema or build the static files itself.
+
+Every setting can be overridden on the command line, e.g. ``-w 2``, or
+through GUNICORN_CMD_ARGS.
+"""
+import multiprocessing
+import os
+
+wsgi_app = 'src.wsgi:app'
+bind = os.environ.get('BIND', '0.0.0.0:7000')
+
+# Pre-fork: the master imports and creates the app once, then forks the
+# workers, which start instantly and share the imported code copy-on-write
+preload_app = True
+workers = int(os.environ.get('WEB_CONCURRENCY', min(multiprocessing.cpu_count() * 2 + 1, 8)))
+# Workers agree through the database, not memory: queue events follow the
+# change feed (src/utils/events.py), and cached users and the clinic config
+# are re-read every few seconds (USER_CACHE_TTL, CLINIC_CONFIG_RECHECK), so
+# a deactivated or demoted user keeps access on other workers for at most
+# USER_CACHE_TTL seconds (src/utils/user_cache.py). Each worker starts its
+# own report pool from a forkserver (src/utils/report_pool.py).
+# Threads per worker: every open screen holds one for its /api/events
+# stream, so each worker takes at most EVENT_STREAMS_PER_WORKER streams
+# (further ones get 503 and retry) and keeps 4 more threads for requests.
+# The server takes workers * EVENT_STREAMS_PER_WORKER screens in all; raise
+# it for more screens, and the threads grow with it. PDF rendering already
+# runs in each worker's report process pool.
+worker_class = 'gthread'
+event_streams = int(os.environ.get('EVENT_STREAMS_PER_WORKER', 4))
+threads = int(os.environ.get('GUNICORN_THREADS', event_streams + 4))
+
+# Recycle each worker after about this many requests, so memory grown by
+# long-lived caches and fragmentation is returned; the jitter keeps workers
+# from restarting together
+max_requests = 2000
+max_requests_jitter = 200
+
+timeout = 120  # large batch reports
+graceful_timeout = 30
+keepalive = 5
+
+# Workers share their metrics here, so /api/metrics covers every worker
+# (see src/utils/metrics.py)
+METRICS_DIR = os.environ.get('METRICS_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src', 'database', 'metrics'))
+
+
+def on_starting(server):
+    # Counters start again from zero with the server, as Prometheus expects
+    from src.utils.metrics import reset_shared_metrics
+    reset_shared_metrics(METRICS_DIR)
+
+
+def post_fork(server, worker):
+    # Nothing should connect before the fork, but make sure no pooled
+    # SQLite connection from the master is ever used by two processes
+    from src.models.user import db
+    from src.utils.metrics import share_metrics
+    from src.wsgi import app
+    with app.app_context():
+        db.engine.dispose(close=False)
+    share_metrics(METRICS_DIR)
+
+
+def worker_exit(server, worker):
+    from src.utils.metrics import flush_metrics
+    flush_metrics()
+
+
+def child_exit(server, worker):
+    # Keep the counts of workers recycled by max_requests
+    from src.utils.metrics import archive_worker_metrics
+    archive_worker_metrics(METRICS_DIR, worker.pid)
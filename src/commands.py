@@ -0,0 +1,634 @@
+"""Maintenance commands, run with ``flask --app src.main <command>``"""
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+import tracemalloc
+
+import click
+from flask import current_app, jsonify
+from flask.cli import with_appcontext
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from src.models.patient import Patient
+from src.models.user import db
+from src.utils.assets import build_assets
+from src.utils.config_cache import clinic_config
+from src.utils.patient_import import BATCH_SIZE, IMPORT_FORMATS, import_patients, read_records
+from src.utils.report_pool import create_report_pool
+from src.utils.schema import upgrade_schema
+from src.utils.serializer import dumps, orjson, patient_serializer
+from src.utils.sqlite_profile import apply_pragmas
+from src.utils.search import backfill_search_keys, rebuild_search_index
+from src.utils.statistics import compute_statistics, read_statistics, rebuild_counters
+from src.utils.visits import migrate_visit_columns, visit_history
+
+
+@click.command('upgrade-db')
+@with_appcontext
+def upgrade_db_command():
+    """Create or upgrade the database schema, triggers and search index."""
+    upgrade_schema()
+    click.echo("Database is up to date.")
+
+
+@click.command('build-assets')
+@with_appcontext
+def build_assets_command():
+    """Fingerprint and precompress the static files for production serving."""
+    build_dir = current_app.config['ASSET_BUILD_DIR']
+    entries = build_assets(current_app.static_folder, build_dir)
+    for name, entry in entries.items():
+        variants = [
+            f"{encoding} {os.path.getsize(os.path.join(build_dir, entry['path'] + ('.br' if encoding == 'br' else '.gz'))):,}"
+            for encoding in entry['encodings']
+        ]
+        if entry['webp']:
+            variants.append(f"webp {os.path.getsize(os.path.join(build_dir, entry['webp'])):,}")
+        click.echo(f"  {entry['path']}: {entry['size']:,} bytes" + (f" ({', '.join(variants)})" if variants else ''))
+    click.echo(f"Built {len(entries)} file(s) into {build_dir}")
+
+
+@click.command('reconcile-stats')
+@with_appcontext
+def reconcile_stats_command():
+    """Rebuild the dashboard counters from patients and report any drift."""
+    drift = rebuild_counters()
+    db.session.commit()
+
+    if drift:
+        click.echo(f"Corrected {len(drift)} drifted counter(s):")
+        for key in sorted(drift):
+            stored, expected = drift[key]
+            click.echo(f"  {key}: {stored} -> {expected}")
+    else:
+        click.echo("Counters match the patients table.")
+
+    if read_statistics() != compute_statistics():
+        raise click.ClickException("Statistics still differ after rebuild")
+
+
+@click.command('rebuild-search-index')
+@with_appcontext
+def rebuild_search_index_command():
+    """Regenerate the full-text patient search index."""
+    rebuild_search_index()
+    db.session.commit()
+    click.echo("Search index rebuilt.")
+
+
+@click.command('backfill-search-keys')
+@click.option('--all', 'recompute_all', is_flag=True,
+              help='Recompute keys for every patient, not only those missing them.')
+@with_appcontext
+def backfill_search_keys_command(recompute_all):
+    """Compute normalized/phonetic name keys for existing patients."""
+    start = time.perf_counter()
+    updated = backfill_search_keys(only_missing=not recompute_all)
+    click.echo(f"Updated search keys for {updated} patients in {time.perf_counter() - start:.1f}s")
+
+
+@click.command('migrate-visits')
+@with_appcontext
+def migrate_visits_command():
+    """Move visits still recorded only on patient rows into the visits table."""
+    created = migrate_visit_columns()
+    db.session.commit()
+    click.echo(f"Created {created} visit(s).")
+
+
+@click.command('import-patients')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'output', type=click.Choice(IMPORT_FORMATS),
+              help='File format; by default taken from the file extension.')
+@click.option('--batch-size', default=BATCH_SIZE, show_default=True, help='Rows inserted per transaction.')
+@with_appcontext
+def import_patients_command(path, output, batch_size):
+    """Register patients from a CSV or NDJSON file, reporting rows that fail validation."""
+    output = output or ('csv' if path.lower().endswith('.csv') else 'ndjson')
+    with open(path, 'rb') as stream:
+        result = import_patients(read_records(stream, output), batch_size)
+
+    for error in result.errors:
+        click.echo(f"  line {error['line']}: {error['error']}")
+    if result.failed > len(result.errors):
+        click.echo(f"  ... and {result.failed - len(result.errors)} more")
+    if result.error:
+        click.echo(f"Error: {result.error}")
+    click.echo(
+        f"Imported {result.imported} patient(s), {result.failed} failed, "
+        f"in {result.elapsed:.2f}s ({result.rows_per_second:,.0f} rows/s)"
+    )
+
+
+@click.command('benchmark-reports')
+@click.option('--count', default=50, show_default=True, help='Number of patient reports to render.')
+@click.option('--workers', 'worker_counts', multiple=True, type=int,
+              help='Pool sizes to time (repeatable). Defaults to 1, 2, 4, ... up to the CPU count.')
+@with_appcontext
+def benchmark_reports_command(count, worker_counts):
+    """Time batch report rendering: serial loop vs. the process pool."""
+    from src.utils.reports import render_patient_report
+    
+    patients = Patient.query.order_by(Patient.id).limit(count).all()
+    if not patients:
+        raise click.ClickException("No patients to render")
+    clinic = clinic_config()
+    if not worker_counts:
+        cpus = os.cpu_count() or 1
+        worker_counts = sorted({min(2 ** power, cpus) for power in range(cpus.bit_length() + 1)})
+
+    start = time.perf_counter()
+    for patient in patients:
+        render_patient_report(patient, clinic)
+    serial = time.perf_counter() - start
+    click.echo(f"{len(patients)} reports, {os.cpu_count()} CPU(s)")
+    click.echo(f"  serial loop: {serial:.2f}s")
+
+    for workers in worker_counts:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            clinics = [clinic] * len(patients)
+            list(pool.map(render_patient_report, patients[:workers], clinics))  # warm up the workers
+            start = time.perf_counter()
+            list(pool.map(render_patient_report, patients, clinics))
+            elapsed = time.perf_counter() - start
+        click.echo(f"  {workers:>2} worker(s): {elapsed:.2f}s ({serial / elapsed:.1f}x)")
+
+
+def _copy_database(source, target):
+    source_db, target_db = sqlite3.connect(source), sqlite3.connect(target)
+    try:
+        source_db.backup(target_db)
+    finally:
+        source_db.close()
+        target_db.close()
+
+
+def _mixed_workload(engine, threads, seconds, write_ratio):
+    """Run reads and writes from several threads; returns (reads, writes, lock errors)"""
+    with engine.connect() as conn:
+        patient_ids = conn.execute(db.text("SELECT id FROM patients")).scalars().all()
+    if not patient_ids:
+        raise click.ClickException("No patients to work on")
+
+    totals = [0, 0, 0]
+    totals_lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def worker(seed):
+        rng = random.Random(seed)
+        counts = [0, 0, 0]
+        while time.perf_counter() < deadline:
+            try:
+                if rng.random() < write_ratio:
+                    with engine.begin() as conn:
+                        conn.execute(
+                            db.text("UPDATE patients SET doctor_comments = :comments WHERE id = :id"),
+                            {'comments': f'benchmark {rng.random()}', 'id': rng.choice(patient_ids)}
+                        )
+                    counts[1] += 1
+                else:
+                    with engine.connect() as conn:
+                        conn.execute(db.text(
+                            "SELECT id, first_name, last_name, status FROM patients "
+                            "ORDER BY visit_datetime DESC LIMIT 100"
+                        )).all()
+                        conn.execute(db.text("SELECT key, value FROM clinic_stats")).all()
+                    counts[0] += 1
+            except OperationalError as e:
+                if 'locked' not in str(e):
+                    raise
+                counts[2] += 1
+        with totals_lock:
+            for index, count in enumerate(counts):
+                totals[index] += count
+
+    workers = [threading.Thread(target=worker, args=(seed,)) for seed in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return tuple(totals)
+
+
+@click.command('benchmark-db')
+@click.option('--threads', default=8, show_default=True, help='Concurrent client threads.')
+@click.option('--seconds', default=5.0, show_default=True, help='Duration of each run.')
+@click.option('--write-ratio', default=0.2, show_default=True, help='Share of operations that write.')
+@with_appcontext
+def benchmark_db_command(threads, seconds, write_ratio):
+    """Compare default SQLite settings with the engine profile under mixed load.
+
+    Each run works on its own copy of the database, so real data is untouched.
+    """
+    profile_options = dict(current_app.config['SQLALCHEMY_ENGINE_OPTIONS'])
+    runs = (
+        ('default', {'journal_mode': 'DELETE'}, {}),
+        ('profile', current_app.config['SQLITE_PRAGMAS'], profile_options),
+    )
+    click.echo(f"{threads} threads, {seconds:g}s per run, {write_ratio:.0%} writes")
+    with tempfile.TemporaryDirectory() as directory:
+        for label, pragmas, options in runs:
+            path = os.path.join(directory, f'{label}.db')
+            _copy_database(db.engine.url.database, path)
+            engine = db.create_engine(f'sqlite:///{path}', **options)
+            apply_pragmas(engine, pragmas)
+            reads, writes, locked = _mixed_workload(engine, threads, seconds, write_ratio)
+            engine.dispose()
+            click.echo(
+                f"  {label}: {(reads + writes) / seconds:,.0f} ops/s "
+                f"({reads} reads, {writes} writes, {locked} lock errors)"
+            )
+
+
+def _add_sample_patients(path, count, start=0):
+    """Insert count synthetic patients, numbered from start, into the database at path"""
+    now = datetime(2024, 1, 1, 9, 30)
+    rows = [
+        (f'First{number}', f'Last{number}', f'2015-{number % 12 + 1:02d}-{number % 28 + 1:02d}',
+         'Female' if number % 2 else 'Male', f'Parent{number}', f'0100{number:07d}',
+         'Cairo', 'Nasr City', f'Street {number % 90}', str(number % 40), '["Peanuts"]', 'Asthma',
+         (now + timedelta(minutes=number)).isoformat(sep=' '), 'examination', 'Out', 'scheduled',
+         now.isoformat(sep=' '), now.isoformat(sep=' '))
+        for number in range(start, start + count)
+    ]
+    connection = sqlite3.connect(path)
+    try:
+        connection.executemany(
+            "INSERT INTO patients (first_name, last_name, date_of_birth, gender, parent_name, phone, "
+            "city, area, street, apartment, allergies, medical_history, visit_datetime, visit_type, "
+            "hall_status, status, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            rows
+        )
+        connection.commit()
+    finally:
+        connection.close()
+
+
+def _benchmark_app(path):
+    """An app on the database at path, for benchmarks that run app code or routes"""
+    from src.main import create_app
+    return create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}'})
+
+
+def _legacy_statistics(now):
+    """The /api/statistics payload as it was computed before compute_statistics, for reference"""
+    today = now.date()
+    start_of_month = datetime(now.year, now.month, 1)
+    total_patients = Patient.query.count()
+    patients = Patient.query.all()
+    total_age = sum((now.date() - patient.date_of_birth).days // 365 for patient in patients)
+    return {
+        'total_patients': total_patients,
+        'new_this_month': Patient.query.filter(Patient.created_at >= start_of_month).count(),
+        'today_patients': Patient.query.filter(Patient.visit_on(today)).count(),
+        'average_age': total_age // len(patients) if patients else 0,
+        'visit_types': {
+            'examination': Patient.query.filter_by(visit_type='examination').count(),
+            'fast_examination': Patient.query.filter_by(visit_type='fast examination').count(),
+            'consultation': Patient.query.filter_by(visit_type='consultation').count()
+        },
+        'hall_status': {
+            'in_hall': Patient.query.filter_by(hall_status='In').count(),
+            'finished': Patient.query.filter_by(status='finished').count()
+        }
+    }
+
+
+@click.command('benchmark-statistics')
+@click.option('--sizes', multiple=True, type=int, default=(1000, 20000, 100000), show_default=True,
+              help='Patients in the table for each run; repeat the option for several.')
+@click.option('--repeat', default=5, show_default=True, help='Timed calls per path (mean is reported).')
+@with_appcontext
+def benchmark_statistics_command(sizes, repeat):
+    """Compare the old per-query statistics with compute_statistics and the counters."""
+    now = datetime.now()
+    paths = (
+        ('per-query (old)', _legacy_statistics),
+        ('compute_statistics', compute_statistics),
+        ('read_statistics', read_statistics),
+    )
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'statistics.db')
+        _copy_database(db.engine.url.database, path)
+        app = _benchmark_app(path)
+        with app.app_context():
+            added = 0
+            for size in sorted(sizes):
+                existing = Patient.query.count()
+                if size > existing:
+                    _add_sample_patients(path, size - existing, start=added)
+                    added += size - existing
+                click.echo(f"{Patient.query.count()} patients, mean of {repeat} calls")
+                results = {}
+                for label, run in paths:
+                    results[label] = run(now)  # warm up
+                    db.session.rollback()
+                    start = time.perf_counter()
+                    for _ in range(repeat):
+                        run(now)
+                        db.session.rollback()
+                    click.echo(f"  {label:<20} {(time.perf_counter() - start) / repeat * 1000:9.2f} ms")
+                if results['per-query (old)'] != results['compute_statistics']:
+                    click.echo("  warning: compute_statistics differs from the per-query result")
+            db.engine.dispose()
+
+
+def _percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+@click.command('benchmark-search')
+@click.option('--rows', 'row_count', default=100000, show_default=True,
+              help='Sample patients added to a copy of the database.')
+@click.option('--queries', default=200, show_default=True, help='Random name prefixes searched per path.')
+@with_appcontext
+def benchmark_search_command(row_count, queries):
+    """Compare the old unbounded ILIKE search with find_patients."""
+    from src.utils.search import find_patients
+    
+    randomizer = random.Random(0)
+    terms = []
+    for _ in range(queries):
+        word = f"{randomizer.choice(('First', 'Last', 'Parent'))}{randomizer.randrange(row_count)}"
+        terms.append(word[:randomizer.randint(3, len(word))])
+    
+    def ilike_path(text):
+        pattern = f'%{text}%'
+        return Patient.query.filter(db.or_(
+            Patient.first_name.ilike(pattern),
+            Patient.last_name.ilike(pattern),
+            Patient.parent_name.ilike(pattern)
+        )).order_by(Patient.created_at.desc()).all()
+    
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'search.db')
+        _copy_database(db.engine.url.database, path)
+        _add_sample_patients(path, row_count)
+        app = _benchmark_app(path)
+        with app.app_context():
+            backfill_search_keys()  # the samples are inserted without them
+            click.echo(f"{row_count} sample patients added, {queries} random name prefixes")
+            for label, run in (('ILIKE, unbounded (old)', ilike_path), ('find_patients', find_patients)):
+                timings = []
+                found = 0
+                for text in terms:
+                    start = time.perf_counter()
+                    found += len(run(text))
+                    timings.append(time.perf_counter() - start)
+                    db.session.rollback()
+                click.echo(
+                    f"  {label:<24} p50 {_percentile(timings, 0.5) * 1000:8.2f} ms, "
+                    f"p99 {_percentile(timings, 0.99) * 1000:8.2f} ms, {found / queries:,.0f} rows per query"
+                )
+            db.engine.dispose()
+
+
+def _legacy_daily_reset():
+    """The daily reset as it was before the set-based UPDATE, for reference"""
+    for patient in Patient.query.all():
+        if patient.status in ['in_hall', 'finished']:
+            patient.hall_status = 'Out'
+            patient.status = 'registered'
+            patient.visit_datetime = None
+            patient.visit_type = None
+            patient.doctor_comments = None
+    db.session.commit()
+
+
+@click.command('benchmark-daily-reset')
+@click.option('--sizes', multiple=True, type=int, default=(1000, 20000, 100000), show_default=True,
+              help='Patients in the table for each run; repeat the option for several.')
+@click.option('--touched', multiple=True, type=int, default=(10, 100, 1000), show_default=True,
+              help='Patients in the hall or finished before each reset; repeat the option for several.')
+@click.option('--repeat', default=3, show_default=True, help='Timed resets per case (mean is reported).')
+@with_appcontext
+def benchmark_daily_reset_command(sizes, touched, repeat):
+    """Compare the old per-patient daily reset with POST /api/patients/daily-reset."""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'daily_reset.db')
+        _copy_database(db.engine.url.database, path)
+        app = _benchmark_app(path)
+        client = app.test_client()
+        
+        def reset_route():
+            response = client.post('/api/patients/daily-reset')
+            assert response.status_code == 200, response.get_json()
+        
+        def fill_hall(count):
+            # The newest count patients, split between the hall and finished
+            db.session.execute(db.text(
+                "UPDATE patients SET hall_status = CASE WHEN id % 2 THEN 'In' ELSE 'Out' END, "
+                "status = CASE WHEN id % 2 THEN 'in_hall' ELSE 'finished' END "
+                "WHERE id IN (SELECT id FROM patients ORDER BY id DESC LIMIT :count)"
+            ), {'count': count})
+            db.session.commit()
+        
+        with app.app_context():
+            added = 0
+            for size in sorted(sizes):
+                existing = Patient.query.count()
+                if size > existing:
+                    _add_sample_patients(path, size - existing, start=added)
+                    added += size - existing
+                click.echo(f"{Patient.query.count()} patients, mean of {repeat} resets")
+                for count in touched:
+                    timings = []
+                    for label, run in (('per patient (old)', _legacy_daily_reset), ('daily-reset', reset_route)):
+                        elapsed = 0
+                        for _ in range(repeat):
+                            fill_hall(count)
+                            db.session.expunge_all()
+                            start = time.perf_counter()
+                            run()
+                            elapsed += time.perf_counter() - start
+                        timings.append(elapsed / repeat)
+                    click.echo(
+                        f"  {count:>6} in the hall: old {timings[0] * 1000:9.2f} ms, "
+                        f"daily-reset {timings[1] * 1000:8.2f} ms ({timings[0] / timings[1]:.1f}x)"
+                    )
+            db.engine.dispose()
+
+
+@click.command('benchmark-serializer')
+@click.option('--rows', 'row_count', default=20000, show_default=True,
+              help='Sample patients added to a copy of the database.')
+@click.option('--repeat', default=3, show_default=True, help='Timed runs per path (best is reported).')
+@with_appcontext
+def benchmark_serializer_command(row_count, repeat):
+    """Compare Patient.to_dict() + jsonify with the column-tuple serializer."""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'serializer.db')
+        _copy_database(db.engine.url.database, path)
+        _add_sample_patients(path, row_count)
+        engine = db.create_engine(f'sqlite:///{path}')
+
+        def orm_path(session):
+            patients = session.query(Patient).order_by(Patient.created_at.desc(), Patient.id.desc()).all()
+            return len(patients), jsonify([patient.to_dict() for patient in patients]).get_data()
+
+        def fast_path(session):
+            serializer = patient_serializer()
+            rows = session.query(*serializer.columns).order_by(Patient.created_at.desc(), Patient.id.desc())
+            items = serializer.to_dicts(rows)
+            return len(items), dumps(items)
+
+        encoder = 'orjson' if orjson is not None else 'json'
+        click.echo(f"Serializing all patients ({row_count} samples added), best of {repeat}:")
+        for label, run in (('to_dict + jsonify', orm_path), (f'columns + {encoder}', fast_path)):
+            best = None
+            for _ in range(repeat):
+                with Session(engine) as session:
+                    start = time.perf_counter()
+                    rows, body = run(session)
+                    elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            with Session(engine) as session:
+                tracemalloc.start()
+                run(session)
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+            click.echo(
+                f"  {label}: {rows / best:,.0f} rows/s, peak {peak / 2**20:.1f} MiB, "
+                f"{len(body) / 2**20:.1f} MiB of JSON"
+            )
+        engine.dispose()
+
+
+@click.command('benchmark-compression')
+@click.option('--rows', 'row_count', default=5000, show_default=True,
+              help='Sample patients added to a copy of the database.')
+@click.option('--repeat', default=5, show_default=True, help='Requests per endpoint and setting.')
+@with_appcontext
+def benchmark_compression_command(row_count, repeat):
+    """Measure bytes on the wire and CPU per request with and without gzip."""
+    endpoints = ('/api/patients', '/api/patients/export', '/api/patients/search-history/First?limit=200')
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'compression.db')
+        _copy_database(db.engine.url.database, path)
+        _add_sample_patients(path, row_count)
+        app = _benchmark_app(path)
+        with app.app_context():
+            backfill_search_keys()  # the samples are inserted without them
+        client = app.test_client()
+        
+        def measure(url, accept_encoding):
+            cpu = None
+            for _ in range(repeat):
+                start = time.process_time()
+                body = client.get(url, headers={'Accept-Encoding': accept_encoding}).get_data()
+                elapsed = time.process_time() - start
+                cpu = elapsed if cpu is None else min(cpu, elapsed)
+            return len(body), cpu
+        
+        click.echo(f"{row_count} sample patients added; CPU time is the best of {repeat} requests")
+        for url in endpoints:
+            click.echo(url)
+            size, base_cpu = measure(url, 'identity')
+            click.echo(f"  identity: {size:>10,} bytes, {base_cpu * 1000:7.1f} ms CPU")
+            for level in (1, 6, 9):
+                app.config['COMPRESS_LEVEL'] = level
+                compressed, cpu = measure(url, 'gzip')
+                click.echo(
+                    f"  gzip -{level}:  {compressed:>10,} bytes ({compressed / size:6.1%}), "
+                    f"{cpu * 1000:7.1f} ms CPU ({(cpu - base_cpu) * 1000:+.1f} ms)"
+                )
+        with app.app_context():
+            db.engine.dispose()
+
+
+def _add_sample_visits(path, per_patient):
+    """Give every patient per_patient past visits, a week apart"""
+    connection = sqlite3.connect(path)
+    try:
+        for week in range(per_patient):
+            connection.execute(
+                "INSERT INTO visits (patient_id, visit_datetime, visit_type, status, hall_status, "
+                "doctor_comments, created_at, updated_at) "
+                "SELECT id, datetime('2024-01-01 09:30', ?), 'examination', 'finished', 'Out', "
+                "'Routine check-up, weight and height on track.', created_at, created_at FROM patients",
+                (f'-{7 * (week + 1)} days',)
+            )
+        connection.commit()
+    finally:
+        connection.close()
+
+
+@click.command('benchmark-report-render')
+@click.option('--count', default=100, show_default=True, help='Reports of each kind per run.')
+@click.option('--visits', default=5, show_default=True, help='Past visits per patient in the history reports.')
+@click.option('--workers', default=None, type=int, help='Report pool size. Defaults to the CPU count.')
+@with_appcontext
+def benchmark_report_render_command(count, visits, workers):
+    """PDFs/s of both reports: templates rebuilt per render, cached, and in the report pool."""
+    from src.utils.report_templates import build_templates
+    from src.utils.reports import render_history_report, render_patient_report
+    
+    workers = workers or os.cpu_count() or 1
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'reports.db')
+        _copy_database(db.engine.url.database, path)
+        _add_sample_patients(path, count)
+        _add_sample_visits(path, visits)
+        app = _benchmark_app(path)
+        with app.app_context():
+            patients = Patient.query.order_by(Patient.id.desc()).limit(count).all()
+            clinic = clinic_config()
+            histories = [visit_history(patient.id) for patient in patients]
+            db.engine.dispose()
+    
+    runs = (
+        ('patient report', render_patient_report, [(patient, clinic) for patient in patients]),
+        ('history report', render_history_report,
+         [(patient, history, clinic) for patient, history in zip(patients, histories)]),
+    )
+    click.echo(f"{count} reports of each kind ({visits} visits per history), {os.cpu_count()} CPU(s)")
+    with create_report_pool(workers) as pool:
+        for label, render, arguments in runs:
+            def rebuilt_render(*args):
+                # As every render did before report_templates
+                return render(*args, templates=build_templates())
+            
+            rates = []
+            for run in (rebuilt_render, render):
+                run(*arguments[0])  # warm up
+                start = time.perf_counter()
+                for args in arguments:
+                    run(*args)
+                rates.append(len(arguments) / (time.perf_counter() - start))
+            
+            list(pool.map(render, *zip(*arguments[:workers])))  # warm up the workers
+            start = time.perf_counter()
+            list(pool.map(render, *zip(*arguments)))
+            rates.append(len(arguments) / (time.perf_counter() - start))
+            
+            click.echo(label)
+            click.echo(f"  templates rebuilt per render: {rates[0]:7.1f} PDFs/s")
+            click.echo(f"  templates cached:             {rates[1]:7.1f} PDFs/s ({rates[1] / rates[0]:.2f}x)")
+            click.echo(f"  report pool, {workers:>2} worker(s):   {rates[2]:7.1f} PDFs/s ({rates[2] / rates[0]:.2f}x)")
+
+
+def register_commands(app):
+    """Attach the maintenance commands to the app's CLI"""
+    app.cli.add_command(upgrade_db_command)
+    app.cli.add_command(build_assets_command)
+    app.cli.add_command(reconcile_stats_command)
+    app.cli.add_command(rebuild_search_index_command)
+    app.cli.add_command(backfill_search_keys_command)
+    app.cli.add_command(migrate_visits_command)
+    app.cli.add_command(import_patients_command)
+    app.cli.add_command(benchmark_reports_command)
+    app.cli.add_command(benchmark_report_render_command)
+    app.cli.add_command(benchmark_db_command)
+    app.cli.add_command(benchmark_serializer_command)
+    app.cli.add_command(benchmark_compression_command)
+    app.cli.add_command(benchmark_statistics_command)
+    app.cli.add_command(benchmark_search_command)
+    app.cli.add_command(benchmark_daily_reset_command)
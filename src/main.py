@@ -3,66 +3,133 @@ import sys
 # DON'T CHANGE THIS !!!
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
-from flask import Flask, send_from_directory, redirect, url_for, session
+from flask import Flask, abort, send_from_directory, redirect, url_for, session
 from flask_cors import CORS
+from werkzeug.exceptions import NotFound
 from src.models.user import db
 from src.models.patient import Patient
 from src.models.clinic_config import ClinicConfig
+from src.models.clinic_stats import ClinicStat
+from src.models.visit import Visit
+from src.models.report_job import ReportJob
+from src.models.patient_change import PatientChange
 from src.routes.user import user_bp
 from src.routes.patient import patient_bp
 from src.routes.clinic import clinic_bp
-
-app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
-app.config['SECRET_KEY'] = 'asdf#FGSgvasgf$5$WGT'
-
-# Enable CORS for all routes
-CORS(app)
-
-app.register_blueprint(user_bp, url_prefix='/api')
-app.register_blueprint(patient_bp, url_prefix='/api')
-app.register_blueprint(clinic_bp, url_prefix='/api')
-
-# uncomment if you need to use database
-app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-db.init_app(app)
-with app.app_context():
-    db.create_all()
+from src.routes.visit import visit_bp
+from src.routes.job import job_bp
+from src.routes.event import event_bp
+from src.routes.metrics import metrics_bp
+from src.utils.assets import send_asset, send_page
+from src.utils.compression import install_compression
+from src.utils.metrics import install_metrics
+from src.utils.schema import upgrade_schema
+from src.utils.sqlite_profile import configure_sqlite_profile, install_sqlite_profile
+from src.commands import register_commands
 
 def is_authenticated():
     """Check if user is authenticated"""
     return 'user_id' in session
 
-@app.route('/login')
-def login_page():
-    """Serve login page"""
-    return send_from_directory(app.static_folder, 'login.html')
-
-@app.route('/', defaults={'path': ''})
-@app.route('/<path:path>')
-def serve(path):
-    static_folder_path = app.static_folder
-    if static_folder_path is None:
-        return "Static folder not configured", 404
-
-    # Check authentication for main app access
-    if path == "" or path == "index.html":
-        if not is_authenticated():
-            return redirect('/login')
+def create_app(config=None):
+    """Create the app; config overrides the defaults below.
 
-    if path != "" and os.path.exists(os.path.join(static_folder_path, path)):
-        return send_from_directory(static_folder_path, path)
-    else:
+    Nothing here touches the database, so the app can be created once in a
+    pre-fork server's master (see gunicorn.conf.py). Schema creation and
+    upgrades are a separate step: ``flask --app src.main upgrade-db``.
+    """
+    app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
+    app.config['SECRET_KEY'] = 'asdf#FGSgvasgf$5$WGT'
+    
+    # Enable CORS for all routes
+    CORS(app)
+    
+    app.register_blueprint(user_bp, url_prefix='/api')
+    app.register_blueprint(patient_bp, url_prefix='/api')
+    app.register_blueprint(clinic_bp, url_prefix='/api')
+    app.register_blueprint(visit_bp, url_prefix='/api')
+    app.register_blueprint(job_bp, url_prefix='/api')
+    app.register_blueprint(event_bp, url_prefix='/api')
+    app.register_blueprint(metrics_bp, url_prefix='/api')
+    
+    # uncomment if you need to use database
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['REPORT_CACHE_DIR'] = os.path.join(os.path.dirname(__file__), 'database', 'report_cache')
+    app.config['REPORT_CACHE_MAX_BYTES'] = 200 * 1024 * 1024
+    app.config['REPORT_JOB_DIR'] = os.path.join(os.path.dirname(__file__), 'database', 'report_jobs')
+    app.config['REPORT_JOB_TTL'] = 3600
+    app.config['REPORT_JOB_MAX_BYTES'] = 100 * 1024 * 1024
+    app.config['REPORT_JOB_THREADS'] = 2  # job-claiming threads per process
+    app.config['USER_CACHE_TTL'] = 5  # how late other workers see a deactivated or demoted user
+    app.config['CLINIC_CONFIG_RECHECK'] = 5
+    # Open /api/events streams per process; each holds a server thread (see gunicorn.conf.py)
+    app.config['EVENT_STREAMS_PER_WORKER'] = int(os.environ.get('EVENT_STREAMS_PER_WORKER', 4))
+    app.config['ASSET_BUILD_DIR'] = os.path.join(os.path.dirname(__file__), 'static_build')
+    app.config['COMPRESS_LEVEL'] = 6
+    app.config['COMPRESS_MIN_SIZE'] = 1024
+    app.config['METRICS_SLOW_REQUEST'] = 1.0  # seconds; None turns the slow-request log off
+    app.config['METRICS_SLOW_SQL'] = 5
+    app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')  # bearer token for a Prometheus scraper
+    if config:
+        app.config.update(config)
+    configure_sqlite_profile(app)
+    db.init_app(app)
+    with app.app_context():
+        install_sqlite_profile(app, db.engine)
+        install_metrics(app, db.engine)
+    install_compression(app)
+    
+    register_commands(app)
+    
+    @app.route('/login')
+    def login_page():
+        """Serve login page"""
+        return send_page('login.html') or send_from_directory(app.static_folder, 'login.html')
+    
+    @app.route('/assets/<path:filename>')
+    def asset(filename):
+        """Serve a fingerprinted asset from build-assets (see src/utils/assets.py)"""
+        return send_asset(filename) or abort(404)
+    
+    @app.route('/', defaults={'path': ''})
+    @app.route('/<path:path>')
+    def serve(path):
+        static_folder_path = app.static_folder
+        if static_folder_path is None:
+            return "Static folder not configured", 404
+    
+        # Check authentication for main app access
+        if path == "" or path == "index.html":
+            if not is_authenticated():
+                return redirect('/login')
+    
+        if path != "" and path != "index.html":
+            # send_from_directory looks the file up itself; unknown paths
+            # fall through to the app
+            try:
+                return send_from_directory(static_folder_path, path)
+            except NotFound:
+                pass
+        
         # For main app access, check authentication
         if not is_authenticated():
             return redirect('/login')
             
-        index_path = os.path.join(static_folder_path, 'index.html')
-        if os.path.exists(index_path):
+        page = send_page('index.html')
+        if page is not None:
+            return page
+        try:
             return send_from_directory(static_folder_path, 'index.html')
-        else:
+        except NotFound:
             return "index.html not found", 404
+    
+    return app
 
 
 if __name__ == '__main__':
+    # Development server; production runs gunicorn -c gunicorn.conf.py
+    app = create_app()
+    with app.app_context():
+        upgrade_schema()
     app.run(host='0.0.0.0', port=7000, debug=True)
@@ -15,7 +15,11 @@ class ClinicConfig(db.Model):
     
     @classmethod
     def get_config(cls):
-        """Get the clinic configuration, create default if doesn't exist"""
+        """Get the clinic configuration, create default if doesn't exist.
+
+        The row is created at startup, so reads normally find it; request
+        handlers read the cached copy from src/utils/config_cache.py.
+        """
         config = cls.query.first()
         if not config:
             config = cls()
@@ -23,6 +27,11 @@ class ClinicConfig(db.Model):
             db.session.commit()
         return config
     
+    @classmethod
+    def version(cls):
+        """updated_at of the configuration, without loading it"""
+        return db.session.query(cls.updated_at).limit(1).scalar()
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -0,0 +1,16 @@
+from src.models.user import db
+
+class ClinicStat(db.Model):
+    """Materialized dashboard counter, e.g. ('status:finished', 12).
+
+    Rows are maintained by triggers on the patients table (see
+    src/utils/statistics.py), so they change in the same transaction as the
+    patient rows they count.
+    """
+    __tablename__ = 'clinic_stats'
+
+    key = db.Column(db.String(100), primary_key=True)
+    value = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<ClinicStat {self.key}={self.value}>'
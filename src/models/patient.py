@@ -1,8 +1,19 @@
 from src.models.user import db
-from datetime import datetime
+from src.models.visit import Visit  # mapped for the visits relationship, wherever Patient is loaded
+from src.utils.names import normalize_name, phonetic_key
+from datetime import datetime, time, timedelta
 
 class Patient(db.Model):
     __tablename__ = 'patients'
+    __table_args__ = (
+        # Daily queue screens: today's list, awaiting hall, finished list
+        db.Index('ix_patients_visit_datetime', 'visit_datetime'),
+        db.Index('ix_patients_status_visit_datetime', 'status', 'visit_datetime'),
+        db.Index('ix_patients_hall_status_visit_datetime', 'hall_status', 'visit_datetime'),
+        db.Index('ix_patients_visit_type', 'visit_type'),
+        # Registry listing / keyset pagination and "new this month"
+        db.Index('ix_patients_created_at_id', 'created_at', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     first_name = db.Column(db.String(100), nullable=False)
@@ -29,23 +40,90 @@ class Patient(db.Model):
     hall_status = db.Column(db.String(20), default='Out')  # In, Out
     doctor_comments = db.Column(db.Text)
     status = db.Column(db.String(50), default='waiting')  # waiting, in_hall, finished
+    # The Visit the visit columns above mirror; cleared by daily_reset
+    current_visit_id = db.Column(db.Integer)
     
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
-    def get_full_address(self):
-        """Return address as a sentence"""
+    # Normalized and phonetic forms of the names, recomputed on every write
+    # and indexed by the full-text search table (see src/utils/search.py)
+    name_key = db.Column(db.String(300))
+    name_phonetic = db.Column(db.String(300))
+    parent_key = db.Column(db.String(300))
+    parent_phonetic = db.Column(db.String(300))
+    
+    visits = db.relationship('Visit', backref='patient', cascade='all, delete-orphan')
+    
+    # Fields returned by to_dict(), in response order. 'full_address' is
+    # derived from the address components rather than stored.
+    API_FIELDS = (
+        'id', 'first_name', 'last_name', 'date_of_birth', 'gender', 'parent_name',
+        'phone', 'patient_phone', 'city', 'area', 'street', 'apartment',
+        'full_address', 'blood_type', 'allergies', 'medical_history',
+        'visit_datetime', 'visit_type', 'hall_status', 'doctor_comments', 'status',
+        'created_at', 'updated_at'
+    )
+    ADDRESS_FIELDS = ('apartment', 'street', 'area', 'city')
+
+    @staticmethod
+    def format_address(apartment, street, area, city):
+        """Join address components into a sentence"""
         address_parts = []
-        if self.apartment:
-            address_parts.append(f"Apartment {self.apartment}")
-        if self.street:
-            address_parts.append(self.street)
-        if self.area:
-            address_parts.append(self.area)
-        if self.city:
-            address_parts.append(self.city)
+        if apartment:
+            address_parts.append(f"Apartment {apartment}")
+        if street:
+            address_parts.append(street)
+        if area:
+            address_parts.append(area)
+        if city:
+            address_parts.append(city)
         return ", ".join(address_parts) if address_parts else ""
-    
+
+    @classmethod
+    def visit_on(cls, day):
+        """Filter for visits on the given day.
+
+        Written as a half-open [day, day + 1) range rather than
+        date(visit_datetime) == day so it can use the visit_datetime indexes.
+        """
+        start = datetime.combine(day, time.min)
+        return db.and_(cls.visit_datetime >= start, cls.visit_datetime < start + timedelta(days=1))
+
+    @staticmethod
+    def search_keys(first_name, last_name, parent_name):
+        """Search key column values for the given names"""
+        child_name = f"{first_name or ''} {last_name or ''}"
+        return {
+            'name_key': normalize_name(child_name),
+            'name_phonetic': phonetic_key(child_name),
+            'parent_key': normalize_name(parent_name),
+            'parent_phonetic': phonetic_key(parent_name),
+        }
+
+    def refresh_search_keys(self):
+        """Recompute the search key columns from the current names"""
+        for column, value in self.search_keys(self.first_name, self.last_name, self.parent_name).items():
+            setattr(self, column, value)
+
+    def get_full_address(self):
+        """Return address as a sentence"""
+        return self.format_address(self.apartment, self.street, self.area, self.city)
+
+    @classmethod
+    def columns_for_fields(cls, fields):
+        """Return the table columns needed to serialize the given API fields.
+
+        'id' is always selected so projected rows stay addressable.
+        """
+        names = ['id']
+        for field in fields:
+            needed = cls.ADDRESS_FIELDS if field == 'full_address' else (field,)
+            for name in needed:
+                if name not in names:
+                    names.append(name)
+        return [getattr(cls, name) for name in names]
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -76,3 +154,8 @@ class Patient(db.Model):
     def __repr__(self):
         return f'<Patient {self.first_name} {self.last_name}>'
 
+
+@db.event.listens_for(Patient, 'before_insert')
+@db.event.listens_for(Patient, 'before_update')
+def _refresh_search_keys(mapper, connection, target):
+    target.refresh_search_keys()
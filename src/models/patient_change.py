@@ -0,0 +1,22 @@
+from src.models.user import db
+
+class PatientChange(db.Model):
+    """The latest change of each patient, numbered in commit order.
+
+    Rows are written by triggers on the patients table (see
+    src/utils/changes.py): every insert, update or delete of a patient
+    replaces that patient's row with one carrying a new, higher seq, so the
+    table holds one row per patient and seq > cursor is exactly the set of
+    patients changed since the cursor. Deleted patients stay as tombstones.
+    """
+    __tablename__ = 'patient_changes'
+    # AUTOINCREMENT: a seq is never handed out twice, even after REPLACE
+    # removes the row holding the highest one
+    __table_args__ = {'sqlite_autoincrement': True}
+
+    seq = db.Column(db.Integer, primary_key=True)
+    patient_id = db.Column(db.Integer, nullable=False, unique=True)
+    deleted = db.Column(db.Boolean, nullable=False, default=False)
+
+    def __repr__(self):
+        return f'<PatientChange {self.seq} patient {self.patient_id}{" deleted" if self.deleted else ""}>'
@@ -0,0 +1,55 @@
+from src.models.user import db
+from datetime import datetime
+import uuid
+
+class ReportJob(db.Model):
+    """A report rendered in the background, polled through GET /api/jobs/<id>.
+
+    The table is the queue: report workers claim the oldest queued job
+    (see src/utils/report_jobs.py) and leave the PDF in the job directory
+    until expires_at.
+    """
+    __tablename__ = 'report_jobs'
+    __table_args__ = (
+        db.Index('ix_report_jobs_status_created_at', 'status', 'created_at'),
+    )
+
+    KINDS = ('report', 'history')
+    DOWNLOAD_NAMES = {
+        'report': 'patient_{}_report.pdf',
+        'history': 'patient_{}_history_report.pdf',
+    }
+
+    # Random, so one job's id says nothing about another's
+    id = db.Column(db.String(32), primary_key=True, default=lambda: uuid.uuid4().hex)
+    kind = db.Column(db.String(20), nullable=False)  # report, history
+    patient_id = db.Column(db.Integer, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, done, failed
+    error = db.Column(db.Text)
+    result_size = db.Column(db.Integer)
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    expires_at = db.Column(db.DateTime)
+
+    @property
+    def download_name(self):
+        return self.DOWNLOAD_NAMES[self.kind].format(self.patient_id)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'patient_id': self.patient_id,
+            'status': self.status,
+            'error': self.error,
+            'result_size': self.result_size,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'expires_at': self.expires_at.isoformat() if self.expires_at else None
+        }
+
+    def __repr__(self):
+        return f'<ReportJob {self.id} {self.kind} {self.status}>'
@@ -0,0 +1,44 @@
+from src.models.user import db
+from datetime import datetime
+
+class Visit(db.Model):
+    """One clinic visit of a patient.
+
+    A reservation creates a Visit and makes it the patient's current visit
+    (Patient.current_visit_id). While it is current, the visit columns on
+    the patient row mirror it and a trigger copies their changes here (see
+    src/utils/visits.py); daily_reset detaches it, so the visit stays on
+    record after the patient row is cleared for the next day.
+    """
+    __tablename__ = 'visits'
+    __table_args__ = (
+        db.Index('ix_visits_patient_id_visit_datetime', 'patient_id', 'visit_datetime'),
+        db.Index('ix_visits_visit_datetime_status', 'visit_datetime', 'status'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    patient_id = db.Column(db.Integer, db.ForeignKey('patients.id', ondelete='CASCADE'), nullable=False)
+    visit_datetime = db.Column(db.DateTime)
+    visit_type = db.Column(db.String(50))  # examination, fast examination, consultation
+    status = db.Column(db.String(50))  # scheduled, in_hall, finished, ...
+    hall_status = db.Column(db.String(20))  # In, Out
+    doctor_comments = db.Column(db.Text)
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'patient_id': self.patient_id,
+            'visit_date': self.visit_datetime.isoformat() if self.visit_datetime else None,
+            'visit_type': self.visit_type,
+            'status': self.status,
+            'hall_status': self.hall_status,
+            'doctor_comments': self.doctor_comments,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+    def __repr__(self):
+        return f'<Visit {self.id} of patient {self.patient_id}>'
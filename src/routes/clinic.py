@@ -2,15 +2,18 @@ from flask import Blueprint, request, jsonify
 from src.models.clinic_config import ClinicConfig
 from src.models.user import db
 from src.routes.user import admin_required
+from src.utils.conditional import clinic_config_version, conditional_get
+from src.utils.config_cache import clinic_config, invalidate_clinic_config
+from src.utils.report_cache import get_report_cache
 
 clinic_bp = Blueprint('clinic', __name__)
 
 @clinic_bp.route('/clinic/config', methods=['GET'])
+@conditional_get(clinic_config_version)
 def get_clinic_config():
     """Get clinic configuration"""
     try:
-        config = ClinicConfig.get_config()
-        return jsonify(config.to_dict()), 200
+        return jsonify(clinic_config()), 200
     except Exception as e:
         print(f"Error in get_clinic_config: {e}")
         return jsonify({'error': str(e)}), 500
@@ -35,6 +38,9 @@ def update_clinic_config():
             config.logo_path = data['logo_path'].strip()
         
         db.session.commit()
+        invalidate_clinic_config()
+        # Every report carries the clinic details
+        get_report_cache().clear()
         
         return jsonify({
             'message': 'Clinic configuration updated successfully',
@@ -0,0 +1,62 @@
+from flask import Blueprint, request, current_app
+import time
+
+from src.utils.conditional import patients_version
+from src.utils.events import (
+    BUSY_RETRY, DEFAULT_MAX_STREAMS, POLL_INTERVAL, change_generation, close_stream, format_event,
+    next_event, open_stream, parse_last_event_id, wait_for_change
+)
+
+event_bp = Blueprint('event', __name__)
+
+# Comment lines sent on idle streams so proxies keep the connection open
+KEEPALIVE_SECONDS = 15
+
+@event_bp.route('/events', methods=['GET'])
+def stream_events():
+    """Server-Sent Events stream of queue changes (see src/utils/events.py)"""
+    app = current_app._get_current_object()
+    if not open_stream(app.config.get('EVENT_STREAMS_PER_WORKER', DEFAULT_MAX_STREAMS)):
+        return current_app.response_class(
+            f'retry: {BUSY_RETRY * 1000}\n\n',
+            status=503,
+            mimetype='text/event-stream',
+            headers={'Cache-Control': 'no-cache', 'Retry-After': str(BUSY_RETRY)}
+        )
+    
+    last_event_id = request.headers.get('Last-Event-ID')
+    cursor = parse_last_event_id(last_event_id)
+    resync = last_event_id is not None and cursor is None
+    if cursor is None:
+        cursor = patients_version()
+
+    def stream():
+        nonlocal cursor
+        yield 'retry: 3000\n\n'
+        if resync:
+            yield format_event(cursor, 'resync', {})
+
+        generation = change_generation()
+        last_sent = time.monotonic()
+        while True:
+            # A short app context per check, so an idle stream holds no
+            # database connection or open read transaction
+            with app.app_context():
+                message, cursor = next_event(cursor)
+            if message:
+                yield message
+                last_sent = time.monotonic()
+            elif time.monotonic() - last_sent >= KEEPALIVE_SECONDS:
+                yield ': keepalive\n\n'
+                last_sent = time.monotonic()
+            generation = wait_for_change(generation, POLL_INTERVAL)
+
+    response = current_app.response_class(
+        stream(),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+    # The server closes the response when the client goes away, whether or
+    # not the stream was ever started
+    response.call_on_close(close_stream)
+    return response
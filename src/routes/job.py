@@ -0,0 +1,47 @@
+from flask import Blueprint, jsonify, send_file
+from datetime import datetime
+
+from src.models.report_job import ReportJob
+from src.models.user import db
+from src.utils.report_jobs import queue_position, result_path, start_report_workers
+
+job_bp = Blueprint('job', __name__)
+
+@job_bp.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Poll a background report job.
+
+    Returns 202 with the job's progress while it is queued or running, the
+    PDF once it is done, and the job with its error if it failed.
+    """
+    try:
+        job = db.session.get(ReportJob, job_id)
+        if job is None or (job.expires_at and job.expires_at < datetime.utcnow()):
+            return jsonify({'error': 'Job not found or expired'}), 404
+        
+        if job.status == 'done':
+            try:
+                response = send_file(
+                    result_path(job.id),
+                    as_attachment=True,
+                    download_name=job.download_name,
+                    mimetype='application/pdf'
+                )
+            except FileNotFoundError:
+                return jsonify({'error': 'Job not found or expired'}), 404
+            response.cache_control.private = True
+            return response
+        
+        result = job.to_dict()
+        if job.status == 'failed':
+            return jsonify(result), 200
+        
+        if job.status == 'queued':
+            result['queue_position'] = queue_position(job)
+            # Jobs left queued by a restarted process are picked up here too
+            start_report_workers()
+        return jsonify(result), 202
+        
+    except Exception as e:
+        print(f"Error in get_job: {e}")
+        return jsonify({'error': str(e)}), 500
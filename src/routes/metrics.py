@@ -0,0 +1,34 @@
+from flask import Blueprint, current_app, jsonify, request
+import hmac
+
+from src.routes.user import admin_required
+from src.utils.metrics import CONTENT_TYPE, metrics_text
+
+metrics_bp = Blueprint('metrics', __name__)
+
+def _scraper_authorized():
+    """A scraper sends the configured METRICS_TOKEN as a bearer token"""
+    token = current_app.config.get('METRICS_TOKEN')
+    if not token:
+        return False
+    return hmac.compare_digest(request.headers.get('Authorization', '').encode(), f'Bearer {token}'.encode())
+
+def _send_metrics():
+    try:
+        response = current_app.response_class(metrics_text(), content_type=CONTENT_TYPE)
+        response.cache_control.no_store = True
+        return response
+
+    except Exception as e:
+        print(f"Error in get_metrics: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@metrics_bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Request, SQL and report metrics in the Prometheus text format (see src/utils/metrics.py).
+
+    Open to admins, and to scrapers presenting METRICS_TOKEN.
+    """
+    if _scraper_authorized():
+        return _send_metrics()
+    return admin_required(_send_metrics)()
@@ -1,23 +1,102 @@
-from flask import Blueprint, request, jsonify
-from datetime import datetime, date
+from flask import Blueprint, current_app, request, jsonify, stream_with_context
+from datetime import date, datetime
 import json # Import json module for handling JSON strings
 
 from src.models.patient import Patient
 from src.models.user import db
+from src.models.visit import Visit
+from src.utils.changes import changes_since, parse_since
+from src.utils.conditional import conditional_get, patient_version, patients_version, patients_version_today
+from src.utils.config_cache import clinic_config
+from src.utils.events import notify_queue_change
+from src.utils.export import EXPORT_FORMATS, export_chunks, export_criteria
+from src.utils.pagination import parse_page_args, paginate_patients
+from src.utils.patient_import import IMPORT_FORMATS, import_patients, patient_values, read_records
+from src.utils.search import find_patients, parse_limit
+from src.utils.serializer import json_response, patient_serializer
+from src.utils.statistics import read_statistics
+from src.utils.visits import recent_visits, visit_history
 
 patient_bp = Blueprint('patient', __name__)
 
 @patient_bp.route('/patients', methods=['GET'])
+@conditional_get(patients_version)
 def get_all_patients():
-    """Get all patients"""
+    """Get all patients, newest first.
+
+    Supports keyset paging (``limit``, ``cursor``), column projection
+    (``fields``) and an optional ``count=1`` total; see src/utils/pagination.py.
+    """
     try:
-        patients = Patient.query.order_by(Patient.created_at.desc()).all()
-        return jsonify([patient.to_dict() for patient in patients]), 200
+        page_args = parse_page_args(request.args)
+        patients, headers = paginate_patients(page_args, Patient.created_at)
+        return json_response(patients, headers=headers)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         print(f"Error in get_all_patients: {e}")
         return jsonify({'error': str(e)}), 500
 
+@patient_bp.route('/patients/changes', methods=['GET'])
+def get_patient_changes():
+    """Get the patients changed since a sync cursor, for clients keeping a local copy.
+
+    Start with no ``since`` to receive every patient, then pass the returned
+    ``cursor`` back as ``since``; repeat while ``has_more`` is true. Deleted
+    patients are listed by id in ``deleted``. Accepts ``limit`` and
+    ``fields`` like /patients.
+    """
+    try:
+        since = parse_since(request.args.get('since'))
+        page_args = parse_page_args(request.args, paged_by_default=True)
+        changed, deleted, cursor, has_more = changes_since(since, page_args.limit, page_args.fields)
+        return json_response({
+            'changes': changed,
+            'deleted': deleted,
+            'cursor': cursor,
+            'has_more': has_more
+        })
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print(f"Error in get_patient_changes: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@patient_bp.route('/patients/export', methods=['GET'])
+def export_patients():
+    """Stream every patient as NDJSON (default) or CSV, for backups and nightly exports.
+
+    ``format`` is ndjson or csv; ``created_from``/``created_to`` and
+    ``visit_from``/``visit_to`` limit the export to [from, to) ranges; and
+    ``gzip=1`` compresses the file as it is sent.
+    """
+    try:
+        output = request.args.get('format', 'ndjson')
+        if output not in EXPORT_FORMATS:
+            return jsonify({'error': f"format must be one of {', '.join(EXPORT_FORMATS)}"}), 400
+        criteria = export_criteria(request.args)
+        compress = request.args.get('gzip', '').lower() in ('1', 'true')
+        
+        filename = f"patients_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{output}"
+        mimetype = EXPORT_FORMATS[output]
+        if compress:
+            filename += '.gz'
+            mimetype = 'application/gzip'
+        
+        return current_app.response_class(
+            stream_with_context(export_chunks(output, criteria, compress)),
+            mimetype=mimetype,
+            headers={'Content-Disposition': f'attachment; filename={filename}'}
+        )
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print(f"Error in export_patients: {e}")
+        return jsonify({'error': str(e)}), 500
+
 @patient_bp.route('/patients/<int:patient_id>', methods=['GET'])
+@conditional_get(patient_version)
 def get_patient(patient_id):
     """Get a specific patient by ID"""
     try:
@@ -31,70 +110,43 @@ def get_patient(patient_id):
 def create_patient():
     """Create a new patient"""
     try:
-        data = request.get_json()
-        
-        # Validate required fields
-        required_fields = ['first_name', 'last_name', 'date_of_birth', 'gender', 'parent_name', 'phone']
-        for field in required_fields:
-            if field not in data or not data[field]:
-                return jsonify({'error': f'Missing required field: {field}'}), 400
-        
-        # Parse date of birth
-        try:
-            date_of_birth = datetime.strptime(data['date_of_birth'], '%Y-%m-%d').date()
-        except ValueError:
-            return jsonify({'error': 'Invalid date format. UseYYYY-MM-DD'}), 400
-        
-        # Handle allergies: convert list to JSON string if provided as a list
-        allergies_data = data.get('allergies')
-        if isinstance(allergies_data, list):
-            allergies_str = json.dumps(allergies_data)
-        elif isinstance(allergies_data, str):
-            allergies_str = allergies_data.strip()
-        else:
-            allergies_str = None # Or an empty string if preferred
-
-        # Handle medical_history: ensure it's a string
-        medical_history_data = data.get('medical_history')
-        if isinstance(medical_history_data, str):
-            medical_history_str = medical_history_data.strip()
-        else:
-            medical_history_str = None # Or an empty string if preferred
-        
-        # Create new patient with new address fields
-        patient = Patient(
-            first_name=data['first_name'].strip(),
-            last_name=data['last_name'].strip(),
-            date_of_birth=date_of_birth,
-            gender=data['gender'],
-            parent_name=data['parent_name'].strip(),
-            phone=data['phone'].strip(),
-            patient_phone=data.get('patient_phone', '').strip() if data.get('patient_phone') else None,
-            city=data.get('city', '').strip(),
-            area=data.get('area', '').strip(),
-            street=data.get('street', '').strip(),
-            apartment=data.get('apartment', '').strip(),
-            blood_type=data.get('blood_type', '').strip(),
-            allergies=allergies_str, # Use the processed string
-            medical_history=medical_history_str, # Use the processed string
-            # visit_datetime and visit_type are now explicitly excluded from initial patient creation
-            visit_datetime=None,
-            visit_type=None, # This line explicitly sets it to None
-            hall_status='Out', # Default status
-            doctor_comments=None,
-            status='registered' # Default status for new patient
-        )
+        patient = Patient(**patient_values(request.get_json()))
         
         db.session.add(patient)
         db.session.commit()
         
         return jsonify(patient.to_dict()), 201
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         db.session.rollback()
         print(f"Error in create_patient: {e}")
         return jsonify({'error': str(e)}), 500
 
+@patient_bp.route('/patients/import', methods=['POST'])
+def import_patients_route():
+    """Register many patients from a CSV or NDJSON request body.
+
+    The format comes from ``format`` or else the Content-Type (text/csv for
+    CSV). Records are validated like create_patient's; invalid ones are
+    listed in the summary with their line numbers and the rest imported.
+    """
+    try:
+        output = request.args.get('format') or ('csv' if request.mimetype == 'text/csv' else 'ndjson')
+        if output not in IMPORT_FORMATS:
+            return jsonify({'error': f"format must be one of {', '.join(IMPORT_FORMATS)}"}), 400
+        
+        result = import_patients(read_records(request.stream, output))
+        if result.error:
+            return jsonify(result.to_dict()), 400
+        return jsonify(result.to_dict()), 200 if result.imported or not result.failed else 400
+        
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error in import_patients: {e}")
+        return jsonify({'error': str(e)}), 500
+
 @patient_bp.route('/patients/<int:patient_id>', methods=['PUT'])
 def update_patient(patient_id):
     """Update an existing patient"""
@@ -178,6 +230,7 @@ def update_patient(patient_id):
 
         patient.updated_at = datetime.utcnow()
         db.session.commit()
+        get_report_cache().invalidate_patient(patient.id)
         
         return jsonify(patient.to_dict()), 200
         
@@ -193,6 +246,7 @@ def delete_patient(patient_id):
         patient = Patient.query.get_or_404(patient_id)
         db.session.delete(patient)
         db.session.commit()
+        get_report_cache().invalidate_patient(patient_id)
         
         return jsonify({'message': 'Patient deleted successfully'}), 200
         
@@ -203,190 +257,172 @@ def delete_patient(patient_id):
 
 @patient_bp.route('/patients/search', methods=['GET'])
 def search_patients():
-    """Search patients by name or parent name"""
+    """Search patients by name, parent name or phone number (ranked, prefix-matched)"""
     try:
         query = request.args.get('q', '').strip()
         if not query:
             return jsonify([]), 200
         
-        patients = Patient.query.filter(
-            db.or_(
-                Patient.first_name.ilike(f'%{query}%'),
-                Patient.last_name.ilike(f'%{query}%'),
-                Patient.parent_name.ilike(f'%{query}%')
-            )
-        ).order_by(Patient.created_at.desc()).all()
+        limit = parse_limit(request.args.get('limit'))
+        patients = find_patients(query, limit=limit)
         
         return jsonify([patient.to_dict() for patient in patients]), 200
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         print(f"Error in search_patients: {e}")
         return jsonify({'error': str(e)}), 500
 
 from flask import send_file
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from reportlab.lib import colors
-from reportlab.lib.enums import TA_CENTER, TA_LEFT
 import io
-import os
 
-@patient_bp.route('/patients/<int:patient_id>/report', methods=['POST'])
+from src.utils.metrics import time_render
+from src.utils.report_cache import get_report_cache
+from src.utils.report_jobs import enqueue_report_job, start_report_workers
+from src.utils.report_pool import MAX_BATCH_REPORTS, iter_zip, render_merged_report, render_reports
+
+def _send_report(kind, patient, render, download_name):
+    """Send a report PDF from the report cache, rendering it only on a miss.
+
+    render(clinic) returns the PDF bytes, given the clinic configuration.
+
+    The cache key is also the ETag, so a GET whose If-None-Match already
+    names the current rendering gets a 304 without touching the cache.
+    """
+    cache = get_report_cache()
+    clinic = clinic_config()
+    key = cache.key(kind, patient.id, patient.updated_at, clinic['updated_at'])
+    if request.method in ('GET', 'HEAD') and key in request.if_none_match:
+        response = current_app.response_class(status=304)
+        response.set_etag(key)
+        return response
+
+    path = cache.get(key)
+    if path is None:
+        path = cache.put(key, time_render(kind, render, clinic))
+
+    response = send_file(
+        path,
+        as_attachment=True,
+        download_name=download_name,
+        mimetype='application/pdf',
+        etag=key
+    )
+    # Patient data: only the requesting client may keep it, and must revalidate
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+def _queue_report(kind, patient):
+    """Queue a background report job and point the client at it"""
+    job = enqueue_report_job(kind, patient.id)
+    db.session.commit()
+    start_report_workers()
+    
+    status_url = f'/api/jobs/{job.id}'
+    return jsonify({
+        'message': 'Report queued',
+        'job_id': job.id,
+        'status': job.status,
+        'status_url': status_url
+    }), 202, {'Location': status_url}
+
+def _wants_async():
+    return request.method == 'POST' and request.args.get('async', '').lower() in ('1', 'true')
+
+@patient_bp.route('/patients/<int:patient_id>/report', methods=['GET', 'POST'])
 def generate_patient_report(patient_id):
-    """Generate a PDF report for a specific patient"""
+    """Generate a PDF report for a specific patient (POST ?async=1 queues a job instead)"""
+    from src.utils.reports import render_patient_report
+    
     try:
         patient = Patient.query.get_or_404(patient_id)
+        if _wants_async():
+            return _queue_report('report', patient)
         
-        buffer = io.BytesIO()
-        
-        doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=72, leftMargin=72,
-                                topMargin=72, bottomMargin=18)
-        
-        story = []
-        
-        styles = getSampleStyleSheet()
-        
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Heading1'],
-            fontSize=24,
-            spaceAfter=30,
-            alignment=TA_CENTER,
-            textColor=colors.HexColor('#4a5568')
-        )
-        
-        header_style = ParagraphStyle(
-            'CustomHeader',
-            parent=styles['Heading2'],
-            fontSize=16,
-            spaceAfter=12,
-            textColor=colors.HexColor('#667eea')
+        return _send_report(
+            'report', patient,
+            lambda clinic: render_patient_report(patient, clinic),
+            f'patient_{patient.id}_report.pdf'
         )
         
-        normal_style = ParagraphStyle(
-            'CustomNormal',
-            parent=styles['Normal'],
-            fontSize=12,
-            spaceAfter=6
-        )
-        
-        today = date.today()
-        age = today.year - patient.date_of_birth.year - ((today.month, today.day) < (patient.date_of_birth.month, patient.date_of_birth.day))
-        
-        story.append(Paragraph("🏥 PEDIATRIC PATIENT REPORT", title_style))
-        story.append(Spacer(1, 20))
-        
-        story.append(Paragraph("Patient Information", header_style))
-        
-        patient_data = [
-            ['Patient ID:', str(patient.id)],
-            ['Full Name:', f"{patient.first_name} {patient.last_name}"],
-            ['Date of Birth:', patient.date_of_birth.strftime('%B %d, %Y')],
-            ['Age:', f"{age} years old"],
-            ['Gender:', patient.gender],
-            ['Parent/Guardian:', patient.parent_name],
-            ['Phone Number:', patient.phone],
-        ]
-        
-        address_parts = []
-        if patient.apartment:
-            address_parts.append(f"Apartment {patient.apartment}")
-        if patient.street:
-            address_parts.append(patient.street)
-        if patient.area:
-            address_parts.append(patient.area)
-        if patient.city:
-            address_parts.append(patient.city)
-            
-        full_address = ", ".join(filter(None, address_parts))
-        if full_address:
-            patient_data.append(['Address:', full_address])
-        
-        if patient.visit_type:
-            patient_data.append(['Visit Type:', patient.visit_type.title()])
-        
-        if patient.visit_datetime:
-            patient_data.append(['Visit Date/Time:', patient.visit_datetime.strftime('%B %d, %Y at %I:%M %p')])
-        
-        if patient.blood_type:
-            patient_data.append(['Blood Type:', patient.blood_type])
-        
-        patient_table = Table(patient_data, colWidths=[2*inch, 4*inch])
-        patient_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#f7fafc')),
-            ('TEXTCOLOR', (0, 0), (0, -1), colors.HexColor('#4a5568')),
-            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-            ('FONTNAME', (1, 0), (1, -1), 'Helvetica'),
-            ('FONTSIZE', (0, 0), (-1, -1), 11),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-            ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#e2e8f0')),
-            ('ROWBACKGROUNDS', (0, 0), (-1, -1), [colors.white, colors.HexColor('#f8f9fa')])
-        ]))
-        
-        story.append(patient_table)
-        story.append(Spacer(1, 20))
-        
-        if patient.allergies:
-            try:
-                # Attempt to load as JSON, if it fails, treat as plain text
-                allergies_list = json.loads(patient.allergies)
-                if allergies_list:
-                    story.append(Paragraph("Known Allergies", header_style))
-                    allergies_text = ", ".join(allergies_list)
-                    story.append(Paragraph(f"⚠️ {allergies_text}", normal_style))
-                    story.append(Spacer(1, 15))
-            except (json.JSONDecodeError, TypeError):
-                if patient.allergies.strip():
-                    story.append(Paragraph("Known Allergies", header_style))
-                    story.append(Paragraph(f"⚠️ {patient.allergies}", normal_style))
-                    story.append(Spacer(1, 15))
-        
-        if patient.medical_history:
-            story.append(Paragraph("Medical History", header_style))
-            story.append(Paragraph(patient.medical_history, normal_style))
-            story.append(Spacer(1, 15))
-        
-        if patient.doctor_comments:
-            story.append(Paragraph("Doctor's Comments", header_style))
-            story.append(Paragraph(patient.doctor_comments, normal_style))
-            story.append(Spacer(1, 15))
-        
-        if hasattr(patient, 'status') and patient.status:
-            story.append(Paragraph("Visit Status", header_style))
-            status_text = patient.status.replace('_', ' ').title()
-            if hasattr(patient, 'hall_status') and patient.hall_status:
-                status_text += f" (Hall Status: {patient.hall_status})"
-            story.append(Paragraph(status_text, normal_style))
-            story.append(Spacer(1, 15))
-        
-        story.append(Spacer(1, 30))
-        footer_style = ParagraphStyle(
-            'Footer',
-            parent=styles['Normal'],
-            fontSize=10,
-            alignment=TA_CENTER,
-            textColor=colors.HexColor('#718096')
-        )
-        
-        story.append(Paragraph("Generated by Pediatric Doctor Management System", footer_style))
-        story.append(Paragraph(f"Report generated on: {date.today().strftime('%B %d, %Y')}", footer_style))
-        
-        doc.build(story)
+    except Exception as e:
+        print(f"Error in generate_patient_report: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@patient_bp.route('/patients/reports/batch', methods=['POST'])
+def generate_batch_reports():
+    """Generate the reports of several patients at once.
+
+    Takes {"patient_ids": [...]} or {"finished_today": true}. Reports are
+    rendered in the report process pool and returned as a streamed ZIP
+    (format "zip", the default) or as one merged PDF (format "pdf").
+    """
+    try:
+        data = request.get_json() or {}
+        output = data.get('format', 'zip')
+        if output not in ('zip', 'pdf'):
+            return jsonify({'error': 'format must be zip or pdf'}), 400
+        
+        if data.get('finished_today'):
+            patients = Patient.query.filter(
+                Patient.status == 'finished',
+                Patient.visit_on(date.today())
+            ).order_by(Patient.visit_datetime, Patient.id).all()
+        else:
+            patient_ids = data.get('patient_ids') or []
+            if not isinstance(patient_ids, list) or not all(
+                isinstance(patient_id, int) and not isinstance(patient_id, bool) for patient_id in patient_ids
+            ):
+                return jsonify({'error': 'patient_ids must be a list of integer IDs'}), 400
+            patient_ids = list(dict.fromkeys(patient_ids))
+            if not patient_ids:
+                return jsonify({'error': 'No patient IDs provided'}), 400
+            if len(patient_ids) > MAX_BATCH_REPORTS:
+                return jsonify({'error': f'At most {MAX_BATCH_REPORTS} patients per batch'}), 400
+            found = {patient.id: patient for patient in Patient.query.filter(Patient.id.in_(patient_ids))}
+            missing = [patient_id for patient_id in patient_ids if patient_id not in found]
+            if missing:
+                return jsonify({'error': 'Patients not found', 'patient_ids': missing}), 404
+            patients = [found[patient_id] for patient_id in patient_ids]
         
-        buffer.seek(0)
+        if not patients:
+            return jsonify({'error': 'No patients to report on'}), 404
+        if len(patients) > MAX_BATCH_REPORTS:
+            return jsonify({'error': f'At most {MAX_BATCH_REPORTS} patients per batch'}), 400
+        
+        stamp = date.today().isoformat()
+        clinic = clinic_config()
+        if output == 'pdf':
+            return send_file(
+                io.BytesIO(render_merged_report(patients, clinic)),
+                as_attachment=True,
+                download_name=f'patient_reports_{stamp}.pdf',
+                mimetype='application/pdf'
+            )
         
-        return send_file(
-            buffer,
-            as_attachment=True,
-            download_name=f'patient_{patient.id}_report.pdf',
-            mimetype='application/pdf'
+        # Reports already in the report cache are not rendered again
+        cache = get_report_cache()
+        keys = [cache.key('report', patient.id, patient.updated_at, clinic['updated_at']) for patient in patients]
+        cached = [cache.read(key) for key in keys]
+        rendered = render_reports([patient for patient, pdf in zip(patients, cached) if pdf is None], clinic)
+        
+        def named_reports():
+            for patient, key, pdf in zip(patients, keys, cached):
+                if pdf is None:
+                    pdf = next(rendered)
+                    cache.put(key, pdf)
+                yield f'patient_{patient.id}_report.pdf', pdf
+        
+        return current_app.response_class(
+            iter_zip(named_reports()),
+            mimetype='application/zip',
+            headers={'Content-Disposition': f'attachment; filename=patient_reports_{stamp}.zip'}
         )
         
     except Exception as e:
-        print(f"Error in generate_patient_report: {e}")
+        print(f"Error in generate_batch_reports: {e}")
         return jsonify({'error': str(e)}), 500
 
 @patient_bp.route('/patients/<int:patient_id>/reservation', methods=['POST'])
@@ -396,29 +432,46 @@ def create_reservation(patient_id):
         data = request.get_json()
         patient = Patient.query.get_or_404(patient_id)
         
-        # visit_type is now handled ONLY here for reservations
-        patient.visit_type = data.get('visit_type')
-        
+        visit_datetime = None # None if not provided or empty
         visit_datetime_str = data.get('visit_datetime')
         if visit_datetime_str: # Check if it's not None or empty string
             try:
                 # Replace 'Z' with '+00:00' for full ISO 8601 compatibility
                 if visit_datetime_str.endswith('Z'):
                     visit_datetime_str = visit_datetime_str[:-1] + '+00:00'
-                patient.visit_datetime = datetime.fromisoformat(visit_datetime_str)
+                visit_datetime = datetime.fromisoformat(visit_datetime_str)
             except ValueError:
                 print(f"DEBUG: Failed to parse visit_datetime in create_reservation: '{visit_datetime_str}'")
                 return jsonify({'error': 'Invalid visit_datetime format. Use ISO 8601 string.'}), 400
-        else:
-            patient.visit_datetime = None # Explicitly set to None if not provided or empty
-
-        patient.hall_status = data.get('hall_status', 'Out')
-        patient.status = data.get('status', 'scheduled')
+        
+        # Record the reservation as a new visit first. The patient's visit
+        # columns must only change in the same UPDATE that makes it the
+        # current visit: the sync trigger would otherwise copy them into the
+        # previous visit, overwriting its record and comments.
+        visit = Visit(
+            patient_id=patient.id,
+            visit_datetime=visit_datetime,
+            visit_type=data.get('visit_type'), # visit_type is now handled ONLY here for reservations
+            status=data.get('status', 'scheduled'),
+            hall_status=data.get('hall_status', 'Out')
+        )
+        db.session.add(visit)
+        db.session.flush()
+        
+        patient.current_visit_id = visit.id
+        patient.visit_type = visit.visit_type
+        patient.visit_datetime = visit.visit_datetime
+        patient.hall_status = visit.hall_status
+        patient.status = visit.status
+        # Comments belong to a visit; the previous visit keeps its own
+        patient.doctor_comments = None
         
         db.session.commit()
+        notify_queue_change()
         
         return jsonify({
             'message': 'Reservation created successfully',
+            'visit_id': visit.id,
             'patient_id': patient.id
         }), 201
         
@@ -438,6 +491,7 @@ def update_hall_status(patient_id):
         patient.status = data.get('status', 'waiting')
         
         db.session.commit()
+        notify_queue_change()
         
         return jsonify({
             'message': 'Hall status updated successfully',
@@ -461,6 +515,7 @@ def save_doctor_comments(patient_id):
         patient.doctor_comments = data.get('comments', '')
         
         db.session.commit()
+        get_report_cache().invalidate_patient(patient.id)
         
         return jsonify({
             'message': 'Comments saved successfully',
@@ -473,59 +528,11 @@ def save_doctor_comments(patient_id):
         return jsonify({'error': str(e)}), 500
 
 @patient_bp.route('/statistics', methods=['GET'])
+@conditional_get(patients_version_today)
 def get_statistics():
     """Get comprehensive statistics for dashboard"""
     try:
-        from datetime import datetime, timedelta
-        
-        now = datetime.now()
-        today = now.date()
-        current_month = now.month
-        current_year = now.year
-        
-        total_patients = Patient.query.count()
-        
-        start_of_month = datetime(current_year, current_month, 1)
-        new_this_month = Patient.query.filter(
-            Patient.created_at >= start_of_month
-        ).count()
-        
-        today_patients = Patient.query.filter(
-            db.func.date(Patient.visit_datetime) == today
-        ).count()
-        
-        patients = Patient.query.all()
-        if patients:
-            total_age = sum(
-                (now.date() - patient.date_of_birth).days // 365 
-                for patient in patients
-            )
-            avg_age = total_age // len(patients)
-        else:
-            avg_age = 0
-        
-        examination_count = Patient.query.filter_by(visit_type='examination').count()
-        fast_examination_count = Patient.query.filter_by(visit_type='fast examination').count()
-        consultation_count = Patient.query.filter_by(visit_type='consultation').count()
-        
-        in_hall_count = Patient.query.filter_by(hall_status='In').count()
-        finished_count = Patient.query.filter_by(status='finished').count()
-        
-        return jsonify({
-            'total_patients': total_patients,
-            'new_this_month': new_this_month,
-            'today_patients': today_patients,
-            'average_age': avg_age,
-            'visit_types': {
-                'examination': examination_count,
-                'fast_examination': fast_examination_count,
-                'consultation': consultation_count
-            },
-            'hall_status': {
-                'in_hall': in_hall_count,
-                'finished': finished_count
-            }
-        }), 200
+        return jsonify(read_statistics()), 200
         
     except Exception as e:
         print(f"Error in get_statistics: {e}")
@@ -536,21 +543,29 @@ def get_statistics():
 def daily_reset():
     """Reset daily patient status and clear reservations"""
     try:
-        # Reset all patients to 'Out' hall status and clear visit information for new day
-        patients = Patient.query.all()
-        for patient in patients:
-            if patient.status in ['in_hall', 'finished']:
-                patient.hall_status = 'Out'
-                patient.status = 'registered'
-                patient.visit_datetime = None
-                patient.visit_type = None
-                patient.doctor_comments = None
+        # Reset in-hall and finished patients to 'Out' hall status and clear
+        # visit information for the new day, in a single UPDATE
+        reset_ids = db.session.execute(
+            db.update(Patient)
+            .where(Patient.status.in_(['in_hall', 'finished']))
+            .values(
+                hall_status='Out',
+                status='registered',
+                visit_datetime=None,
+                visit_type=None,
+                doctor_comments=None,
+                current_visit_id=None  # the visit itself stays on record
+            )
+            .returning(Patient.id)
+        ).scalars().all()
         
         db.session.commit()
+        notify_queue_change()
         
         return jsonify({
             'message': 'Daily reset completed successfully',
-            'reset_count': len(patients)
+            'reset_count': len(reset_ids),
+            'patient_ids': reset_ids
         }), 200
         
     except Exception as e:
@@ -563,32 +578,22 @@ def search_patient_history(patient_name):
     """Search for patient by name and get complete visit history"""
     try:
         # Search for patients by name (first name or last name)
-        patients = Patient.query.filter(
-            db.or_(
-                Patient.first_name.ilike(f'%{patient_name}%'),
-                Patient.last_name.ilike(f'%{patient_name}%')
-            )
-        ).order_by(Patient.created_at.desc()).all()
+        patients = find_patients(
+            patient_name, columns=['name_key'],
+            limit=parse_limit(request.args.get('limit'))
+        )
         
         if not patients:
             return jsonify({'message': 'No patients found with that name'}), 404
         
-        # Get complete history for each patient
+        # Get the latest visits for each patient in one query; older visits
+        # are paged through GET /patients/<id>/visits
+        visits_by_patient = recent_visits([patient.id for patient in patients])
         patient_histories = []
         for patient in patients:
-            # For now, we'll return the patient data with all visit information
-            # In a more complex system, you might have a separate visits table
             history = {
                 'patient_info': patient.to_dict(),
-                'visit_history': [
-                    {
-                        'visit_date': patient.visit_datetime.isoformat() if patient.visit_datetime else None,
-                        'visit_type': patient.visit_type,
-                        'doctor_comments': patient.doctor_comments,
-                        'status': patient.status,
-                        'hall_status': patient.hall_status
-                    }
-                ] if patient.visit_datetime else []
+                'visit_history': [visit.to_dict() for visit in visits_by_patient[patient.id]]
             }
             patient_histories.append(history)
         
@@ -601,179 +606,22 @@ def search_patient_history(patient_name):
         print(f"Error in search_patient_history: {e}")
         return jsonify({'error': str(e)}), 500
 
-@patient_bp.route('/patients/<int:patient_id>/history-report', methods=['POST'])
+@patient_bp.route('/patients/<int:patient_id>/history-report', methods=['GET', 'POST'])
 def generate_patient_history_report(patient_id):
-    """Generate a comprehensive history report for a specific patient"""
+    """Generate a comprehensive history report for a specific patient (POST ?async=1 queues a job instead)"""
+    from src.utils.reports import render_history_report
+    
     try:
         patient = Patient.query.get_or_404(patient_id)
-        
-        buffer = io.BytesIO()
-        
-        doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=72, leftMargin=72,
-                                topMargin=72, bottomMargin=18)
-        
-        story = []
-        
-        styles = getSampleStyleSheet()
-        
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Heading1'],
-            fontSize=24,
-            spaceAfter=30,
-            alignment=TA_CENTER,
-            textColor=colors.HexColor('#4a5568')
-        )
-        
-        header_style = ParagraphStyle(
-            'CustomHeader',
-            parent=styles['Heading2'],
-            fontSize=16,
-            spaceAfter=12,
-            textColor=colors.HexColor('#667eea')
-        )
-        
-        normal_style = ParagraphStyle(
-            'CustomNormal',
-            parent=styles['Normal'],
-            fontSize=12,
-            spaceAfter=6
-        )
-        
-        today = date.today()
-        age = today.year - patient.date_of_birth.year - ((today.month, today.day) < (patient.date_of_birth.month, patient.date_of_birth.day))
-        
-        story.append(Paragraph("🏥 PATIENT HISTORY REPORT", title_style))
-        story.append(Spacer(1, 20))
-        
-        story.append(Paragraph("Patient Information", header_style))
-        
-        patient_data = [
-            ['Patient ID:', str(patient.id)],
-            ['Full Name:', f"{patient.first_name} {patient.last_name}"],
-            ['Date of Birth:', patient.date_of_birth.strftime('%B %d, %Y')],
-            ['Age:', f"{age} years old"],
-            ['Gender:', patient.gender],
-            ['Parent/Guardian:', patient.parent_name],
-            ['Parent Phone:', patient.phone],
-        ]
-        
-        if patient.patient_phone:
-            patient_data.append(['Patient Phone:', patient.patient_phone])
-        
-        address_parts = []
-        if patient.apartment:
-            address_parts.append(f"Apartment {patient.apartment}")
-        if patient.street:
-            address_parts.append(patient.street)
-        if patient.area:
-            address_parts.append(patient.area)
-        if patient.city:
-            address_parts.append(patient.city)
-            
-        full_address = ", ".join(filter(None, address_parts))
-        if full_address:
-            patient_data.append(['Address:', full_address])
-        
-        if patient.blood_type:
-            patient_data.append(['Blood Type:', patient.blood_type])
-        
-        patient_table = Table(patient_data, colWidths=[2*inch, 4*inch])
-        patient_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#f7fafc')),
-            ('TEXTCOLOR', (0, 0), (0, -1), colors.HexColor('#4a5568')),
-            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-            ('FONTNAME', (1, 0), (1, -1), 'Helvetica'),
-            ('FONTSIZE', (0, 0), (-1, -1), 11),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-            ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#e2e8f0')),
-            ('ROWBACKGROUNDS', (0, 0), (-1, -1), [colors.white, colors.HexColor('#f8f9fa')])
-        ]))
-        
-        story.append(patient_table)
-        story.append(Spacer(1, 20))
-        
-        # Visit History Section
-        story.append(Paragraph("Visit History", header_style))
-        
-        if patient.visit_datetime:
-            visit_data = [
-                ['Visit Date/Time:', patient.visit_datetime.strftime('%B %d, %Y at %I:%M %p')],
-                ['Visit Type:', patient.visit_type.title() if patient.visit_type else 'Not specified'],
-                ['Status:', patient.status.replace('_', ' ').title() if patient.status else 'Not specified'],
-                ['Hall Status:', patient.hall_status if patient.hall_status else 'Not specified']
-            ]
-            
-            visit_table = Table(visit_data, colWidths=[2*inch, 4*inch])
-            visit_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#f0f8ff')),
-                ('TEXTCOLOR', (0, 0), (0, -1), colors.HexColor('#4a5568')),
-                ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-                ('FONTNAME', (1, 0), (1, -1), 'Helvetica'),
-                ('FONTSIZE', (0, 0), (-1, -1), 11),
-                ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-                ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#e2e8f0')),
-                ('ROWBACKGROUNDS', (0, 0), (-1, -1), [colors.white, colors.HexColor('#f8f9fa')])
-            ]))
-            
-            story.append(visit_table)
-            story.append(Spacer(1, 15))
-        else:
-            story.append(Paragraph("No visit history recorded.", normal_style))
-            story.append(Spacer(1, 15))
-        
-        if patient.allergies:
-            try:
-                # Attempt to load as JSON, if it fails, treat as plain text
-                allergies_list = json.loads(patient.allergies)
-                if allergies_list:
-                    story.append(Paragraph("Known Allergies", header_style))
-                    allergies_text = ", ".join(allergies_list)
-                    story.append(Paragraph(f"⚠️ {allergies_text}", normal_style))
-                    story.append(Spacer(1, 15))
-            except (json.JSONDecodeError, TypeError):
-                if patient.allergies.strip():
-                    story.append(Paragraph("Known Allergies", header_style))
-                    story.append(Paragraph(f"⚠️ {patient.allergies}", normal_style))
-                    story.append(Spacer(1, 15))
-        
-        if patient.medical_history:
-            story.append(Paragraph("Medical History", header_style))
-            story.append(Paragraph(patient.medical_history, normal_style))
-            story.append(Spacer(1, 15))
-        
-        if patient.doctor_comments:
-            story.append(Paragraph("Doctor's Comments & Medications", header_style))
-            story.append(Paragraph(patient.doctor_comments, normal_style))
-            story.append(Spacer(1, 15))
-        
-        story.append(Spacer(1, 30))
-        footer_style = ParagraphStyle(
-            'Footer',
-            parent=styles['Normal'],
-            fontSize=10,
-            alignment=TA_CENTER,
-            textColor=colors.HexColor('#718096')
-        )
-        
-        # Add doctor's name and clinic phone to footer
-        story.append(Paragraph("Dr. [Doctor Name] - [Clinic Name]", footer_style))
-        story.append(Paragraph("Clinic Phone: [Clinic Phone Number]", footer_style))
-        story.append(Spacer(1, 10))
-        story.append(Paragraph("Generated by Pediatric Doctor Management System", footer_style))
-        story.append(Paragraph(f"Report generated on: {date.today().strftime('%B %d, %Y')}", footer_style))
-        
-        doc.build(story)
-        
-        buffer.seek(0)
-        
-        return send_file(
-            buffer,
-            as_attachment=True,
-            download_name=f'patient_{patient.id}_history_report.pdf',
-            mimetype='application/pdf'
+        if _wants_async():
+            return _queue_report('history', patient)
+        
+        # Visits only change through the patient row (see src/utils/visits.py),
+        # so patient.updated_at in the cache key covers them too
+        return _send_report(
+            'history', patient,
+            lambda clinic: render_history_report(patient, visit_history(patient.id), clinic),
+            f'patient_{patient.id}_history_report.pdf'
         )
         
     except Exception as e:
@@ -781,34 +629,36 @@ def generate_patient_history_report(patient_id):
         return jsonify({'error': str(e)}), 500
 
 
-
 @patient_bp.route('/patients/submit-to-hall', methods=['POST'])
 def submit_to_hall():
     """Submit only 'In' patients from today's reservations to awaiting hall"""
     try:
-        from datetime import datetime, date
-        
         today = date.today()
         
-        # Find today's patients with 'In' hall_status who are not already in hall or finished
-        today_in_patients = Patient.query.filter(
-            db.func.date(Patient.visit_datetime) == today,
-            Patient.hall_status == 'In',
-            Patient.status.notin_(['in_hall', 'finished'])  # Not already in hall or finished
-        ).all()
+        # Move today's patients with 'In' hall_status who are not already in
+        # hall or finished to 'in_hall', in a single UPDATE
+        submitted_ids = db.session.execute(
+            db.update(Patient)
+            .where(
+                Patient.visit_on(today),
+                Patient.hall_status == 'In',
+                Patient.status.notin_(['in_hall', 'finished'])  # Not already in hall or finished
+            )
+            .values(status='in_hall')
+            .returning(Patient.id)
+        ).scalars().all()
         
-        if not today_in_patients:
+        if not submitted_ids:
+            db.session.rollback()
             return jsonify({'message': 'No "In" patients to submit to hall'}), 200
         
-        # Update status to 'in_hall' for these patients
-        for patient in today_in_patients:
-            patient.status = 'in_hall'
-        
         db.session.commit()
+        notify_queue_change()
         
         return jsonify({
-            'message': f'{len(today_in_patients)} "In" patients submitted to awaiting hall successfully',
-            'submitted_count': len(today_in_patients)
+            'message': f'{len(submitted_ids)} "In" patients submitted to awaiting hall successfully',
+            'submitted_count': len(submitted_ids),
+            'patient_ids': submitted_ids
         }), 200
         
     except Exception as e:
@@ -826,25 +676,26 @@ def return_to_today():
         if not patient_ids:
             return jsonify({'error': 'No patient IDs provided'}), 400
         
-        # Find patients in awaiting hall
-        patients_to_return = Patient.query.filter(
-            Patient.id.in_(patient_ids),
-            Patient.status == 'in_hall'
-        ).all()
-        
-        if not patients_to_return:
+        # Return selected patients in awaiting hall to today's patients
+        # (status: scheduled), keeping their original hall_status (In or Out)
+        returned_ids = db.session.execute(
+            db.update(Patient)
+            .where(Patient.id.in_(patient_ids), Patient.status == 'in_hall')
+            .values(status='scheduled')
+            .returning(Patient.id)
+        ).scalars().all()
+        
+        if not returned_ids:
+            db.session.rollback()
             return jsonify({'message': 'No patients found in awaiting hall'}), 200
         
-        # Return them to today's patients (status: scheduled)
-        for patient in patients_to_return:
-            patient.status = 'scheduled'
-            # Keep their original hall_status (In or Out)
-        
         db.session.commit()
+        notify_queue_change()
         
         return jsonify({
-            'message': f'{len(patients_to_return)} patients returned to today\'s patients',
-            'returned_count': len(patients_to_return)
+            'message': f'{len(returned_ids)} patients returned to today\'s patients',
+            'returned_count': len(returned_ids),
+            'patient_ids': returned_ids
         }), 200
         
     except Exception as e:
@@ -862,25 +713,26 @@ def finish_selected_patients():
         if not patient_ids:
             return jsonify({'error': 'No patient IDs provided'}), 400
         
-        # Find patients in awaiting hall
-        patients_to_finish = Patient.query.filter(
-            Patient.id.in_(patient_ids),
-            Patient.status == 'in_hall'
-        ).all()
-        
-        if not patients_to_finish:
+        # Mark selected patients in awaiting hall as finished; they leave
+        # the hall when finished
+        finished_ids = db.session.execute(
+            db.update(Patient)
+            .where(Patient.id.in_(patient_ids), Patient.status == 'in_hall')
+            .values(status='finished', hall_status='Out')
+            .returning(Patient.id)
+        ).scalars().all()
+        
+        if not finished_ids:
+            db.session.rollback()
             return jsonify({'message': 'No patients found in awaiting hall'}), 200
         
-        # Mark them as finished
-        for patient in patients_to_finish:
-            patient.status = 'finished'
-            patient.hall_status = 'Out'  # They leave the hall when finished
-        
         db.session.commit()
+        notify_queue_change()
         
         return jsonify({
-            'message': f'{len(patients_to_finish)} patients marked as finished',
-            'finished_count': len(patients_to_finish)
+            'message': f'{len(finished_ids)} patients marked as finished',
+            'finished_count': len(finished_ids),
+            'patient_ids': finished_ids
         }), 200
         
     except Exception as e:
@@ -889,6 +741,7 @@ def finish_selected_patients():
         return jsonify({'error': str(e)}), 500
 
 @patient_bp.route('/patients/today', methods=['GET'])
+@conditional_get(patients_version_today)
 def get_today_patients():
     """Get today's patients with their current status"""
     try:
@@ -896,40 +749,47 @@ def get_today_patients():
         
         today = date.today()
         
-        today_patients = Patient.query.filter(
-            db.func.date(Patient.visit_datetime) == today
-        ).order_by(Patient.visit_datetime).all()
+        serializer = patient_serializer()
+        today_patients = db.session.query(*serializer.columns).filter(
+            Patient.visit_on(today)
+        ).order_by(Patient.visit_datetime)
         
-        return jsonify([patient.to_dict() for patient in today_patients]), 200
+        return json_response(serializer.to_dicts(today_patients))
         
     except Exception as e:
         print(f"Error in get_today_patients: {e}")
         return jsonify({'error': str(e)}), 500
 
 @patient_bp.route('/patients/awaiting', methods=['GET'])
+@conditional_get(patients_version)
 def get_awaiting_patients():
     """Get patients currently in awaiting hall"""
     try:
-        awaiting_patients = Patient.query.filter(
+        serializer = patient_serializer()
+        awaiting_patients = db.session.query(*serializer.columns).filter(
             Patient.status == 'in_hall'
-        ).order_by(Patient.visit_datetime).all()
+        ).order_by(Patient.visit_datetime)
         
-        return jsonify([patient.to_dict() for patient in awaiting_patients]), 200
+        return json_response(serializer.to_dicts(awaiting_patients))
         
     except Exception as e:
         print(f"Error in get_awaiting_patients: {e}")
         return jsonify({'error': str(e)}), 500
 
 @patient_bp.route('/patients/finished', methods=['GET'])
+@conditional_get(patients_version)
 def get_finished_patients():
-    """Get patients who have finished their visits"""
+    """Get patients who have finished their visits (supports the same paging as /patients)"""
     try:
-        finished_patients = Patient.query.filter(
-            Patient.status == 'finished'
-        ).order_by(Patient.visit_datetime.desc()).all()
+        page_args = parse_page_args(request.args)
+        finished_patients, headers = paginate_patients(
+            page_args, Patient.visit_datetime, Patient.status == 'finished'
+        )
         
-        return jsonify([patient.to_dict() for patient in finished_patients]), 200
+        return json_response(finished_patients, headers=headers)
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         print(f"Error in get_finished_patients: {e}")
         return jsonify({'error': str(e)}), 500
@@ -1,5 +1,6 @@
 from flask import Blueprint, jsonify, request, session
 from src.models.user import User, db
+from src.utils.user_cache import current_user, invalidate_user
 from datetime import datetime
 from functools import wraps
 
@@ -21,8 +22,8 @@ def admin_required(f):
         if 'user_id' not in session:
             return jsonify({'error': 'Authentication required'}), 401
         
-        user = User.query.get(session['user_id'])
-        if not user or not user.is_admin():
+        user = current_user()
+        if not user or not user['is_active'] or user['role'] != 'admin':
             return jsonify({'error': 'Admin access required'}), 403
         return f(*args, **kwargs)
     return decorated_function
@@ -48,6 +49,7 @@ def login():
             # Update last login
             user.last_login = datetime.utcnow()
             db.session.commit()
+            invalidate_user(user.id)
             
             return jsonify({
                 'message': 'Login successful',
@@ -72,9 +74,9 @@ def logout():
 def get_current_user():
     """Get current logged-in user"""
     try:
-        user = User.query.get(session['user_id'])
+        user = current_user()
         if user:
-            return jsonify(user.to_dict()), 200
+            return jsonify(user), 200
         else:
             session.clear()
             return jsonify({'error': 'User not found'}), 404
@@ -86,11 +88,11 @@ def get_current_user():
 def check_session():
     """Check if user is logged in"""
     if 'user_id' in session:
-        user = User.query.get(session['user_id'])
-        if user and user.is_active:
+        user = current_user()
+        if user and user['is_active']:
             return jsonify({
                 'authenticated': True,
-                'user': user.to_dict()
+                'user': user
             }), 200
     
     return jsonify({'authenticated': False}), 200
@@ -185,6 +187,7 @@ def update_user(user_id):
             user.is_active = data['is_active']
         
         db.session.commit()
+        invalidate_user(user_id)
         return jsonify(user.to_dict())
         
     except Exception as e:
@@ -207,6 +210,7 @@ def delete_user(user_id):
         
         db.session.delete(user)
         db.session.commit()
+        invalidate_user(user_id)
         return jsonify({'message': 'User deleted successfully'}), 200
         
     except Exception as e:
@@ -233,6 +237,7 @@ def change_password():
         
         user.set_password(new_password)
         db.session.commit()
+        invalidate_user(user.id)
         
         return jsonify({'message': 'Password changed successfully'}), 200
         
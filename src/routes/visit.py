@@ -0,0 +1,28 @@
+from flask import Blueprint, request, jsonify
+
+from src.models.patient import Patient
+from src.models.visit import Visit
+from src.utils.pagination import keyset_page, parse_page_args
+
+visit_bp = Blueprint('visit', __name__)
+
+@visit_bp.route('/patients/<int:patient_id>/visits', methods=['GET'])
+def get_patient_visits(patient_id):
+    """Get a patient's visit history, newest first, one page at a time.
+
+    Pages are keyed on (visit_datetime, id): pass the X-Next-Cursor header
+    of a response back as ``cursor`` to get the next page.
+    """
+    Patient.query.get_or_404(patient_id)
+    try:
+        page_args = parse_page_args(request.args, allowed_fields=(), paged_by_default=True)
+        visits, headers = keyset_page(
+            Visit.query.filter(Visit.patient_id == patient_id),
+            page_args, Visit.visit_datetime, Visit.id
+        )
+        return jsonify([visit.to_dict() for visit in visits]), 200, headers
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print(f"Error in get_patient_visits: {e}")
+        return jsonify({'error': str(e)}), 500
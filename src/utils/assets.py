@@ -0,0 +1,241 @@
+"""Fingerprinted, precompressed static assets.
+
+``flask --app src.main build-assets`` copies src/static into
+ASSET_BUILD_DIR. Every asset except the HTML pages is renamed after its
+content ("images.3f2a91c0.jpeg"); a gzip variant and, with the brotli
+package installed, a brotli variant are stored next to every file that
+compresses well; and JPEG/PNG images get a WebP variant when it is
+smaller. The pages are copied with their asset references rewritten to
+the fingerprinted URLs under /assets/, so those files can be cached for a
+year: a changed asset gets a new name.
+
+The serving side picks the smallest variant the client accepts. The
+manifest is loaded once per process, and entries whose source file changed
+since the build are ignored, so a stale build never hides an edit. In
+debug mode, or without a build, the files in src/static are served as
+they are.
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import shutil
+
+from flask import current_app, request, send_from_directory
+
+try:
+    import brotli
+except ImportError:  # optional, see requirements.txt
+    brotli = None
+
+PAGES = ('index.html', 'login.html')
+ASSET_URL_PREFIX = '/assets/'
+MANIFEST_NAME = 'manifest.json'
+
+# Precompressed variants, in order of preference when accepted
+ENCODINGS = ('br', 'gzip')
+# Variants that save less than this are not stored
+MIN_SAVING = 0.1
+COMPRESSIBLE_TYPES = (
+    'text/', 'application/javascript', 'application/json',
+    'image/svg+xml', 'image/vnd.microsoft.icon', 'image/x-icon',
+)
+WEBP_SOURCES = ('.jpg', '.jpeg', '.png')
+WEBP_QUALITY = 80
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+_manifest = None  # (build dir, {name: entry}, {built path: entry}) of this process
+
+
+def _digest(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def _compressible(name):
+    mimetype = mimetypes.guess_type(name)[0] or ''
+    return mimetype.startswith(COMPRESSIBLE_TYPES)
+
+
+def _compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=11)
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def _write_variants(build_dir, path, data):
+    """Store the precompressed variants of a file; returns their encodings"""
+    encodings = []
+    for encoding in ENCODINGS:
+        if encoding == 'br' and brotli is None:
+            continue
+        compressed = _compress(data, encoding)
+        if len(compressed) <= len(data) * (1 - MIN_SAVING):
+            with open(os.path.join(build_dir, f'{path}.{"br" if encoding == "br" else "gz"}'), 'wb') as variant:
+                variant.write(compressed)
+            encodings.append(encoding)
+    return encodings
+
+
+def _write_webp(build_dir, source_path, path, size):
+    """Store a WebP version of an image if it is smaller; returns its name or None"""
+    from PIL import Image
+
+    webp_path = os.path.splitext(path)[0] + '.webp'
+    target = os.path.join(build_dir, webp_path)
+    with Image.open(source_path) as image:
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'A' in image.getbands() or 'transparency' in image.info else 'RGB')
+        image.save(target, 'WEBP', quality=WEBP_QUALITY, method=6)
+    if os.path.getsize(target) >= size * (1 - MIN_SAVING):
+        os.remove(target)
+        return None
+    return webp_path
+
+
+def _rewrite_references(html, entries):
+    """Point the page's references to static assets at their fingerprinted URLs"""
+    for name, entry in entries.items():
+        if name in PAGES:
+            continue
+        # src="/x.jpeg", href="x.jpeg", url('x.jpeg') ...
+        pattern = r'(?<=["\'(])/?%s(?=["\')])' % re.escape(name)
+        html = re.sub(pattern, ASSET_URL_PREFIX + entry['path'], html)
+    return html
+
+
+def build_assets(static_dir, build_dir):
+    """Build the assets in static_dir into build_dir (replacing it); returns the manifest"""
+    if os.path.isdir(build_dir):
+        shutil.rmtree(build_dir)
+    os.makedirs(build_dir)
+
+    entries = {}
+    names = sorted(
+        name for name in os.listdir(static_dir)
+        if os.path.isfile(os.path.join(static_dir, name)) and name not in PAGES
+    )
+    for name in names:
+        source_path = os.path.join(static_dir, name)
+        with open(source_path, 'rb') as source:
+            data = source.read()
+        digest = _digest(data)
+        stem, extension = os.path.splitext(name)
+        path = f'{stem}.{digest[:8]}{extension}'
+        with open(os.path.join(build_dir, path), 'wb') as target:
+            target.write(data)
+        entries[name] = {
+            'path': path,
+            'source_digest': digest,
+            'size': len(data),
+            'encodings': _write_variants(build_dir, path, data) if _compressible(name) else [],
+            'webp': _write_webp(build_dir, source_path, path, len(data)) if extension.lower() in WEBP_SOURCES else None,
+        }
+
+    for name in PAGES:
+        source_path = os.path.join(static_dir, name)
+        if not os.path.isfile(source_path):
+            continue
+        with open(source_path, 'rb') as source:
+            data = source.read()
+        page = _rewrite_references(data.decode('utf-8'), entries).encode('utf-8')
+        with open(os.path.join(build_dir, name), 'wb') as target:
+            target.write(page)
+        entries[name] = {
+            'path': name,
+            'source_digest': _digest(data),
+            'size': len(page),
+            'encodings': _write_variants(build_dir, name, page),
+            'webp': None,
+        }
+
+    with open(os.path.join(build_dir, MANIFEST_NAME), 'w') as manifest:
+        json.dump(entries, manifest, indent=2, sort_keys=True)
+    return entries
+
+
+def _load_manifest(static_dir, build_dir):
+    try:
+        with open(os.path.join(build_dir, MANIFEST_NAME)) as manifest:
+            entries = json.load(manifest)
+    except FileNotFoundError:
+        return {}
+
+    current = {}
+    for name, entry in entries.items():
+        try:
+            with open(os.path.join(static_dir, name), 'rb') as source:
+                if _digest(source.read()) != entry['source_digest']:
+                    print(f"Static file {name} changed since build-assets, serving it unbuilt")
+                    continue
+        except FileNotFoundError:
+            continue
+        current[name] = entry
+    # A page pointing at an asset that is no longer current would break it
+    if len(current) < len(entries):
+        current = {name: entry for name, entry in current.items() if name not in PAGES}
+    return current
+
+
+def _current_manifest():
+    global _manifest
+    build_dir = current_app.config['ASSET_BUILD_DIR']
+    if _manifest is None or _manifest[0] != build_dir:
+        entries = _load_manifest(current_app.static_folder, build_dir)
+        by_path = {entry['path']: entry for name, entry in entries.items() if name not in PAGES}
+        _manifest = (build_dir, entries, by_path)
+    return _manifest
+
+
+def asset_manifest():
+    """This process's {static file name: build entry}; empty when not built"""
+    return {} if current_app.debug else _current_manifest()[1]
+
+
+def _accepts(encoding):
+    return request.accept_encodings[encoding] > 0
+
+
+def send_built_file(entry, max_age):
+    """Send a built file, choosing the WebP and compressed variants the client accepts"""
+    build_dir = current_app.config['ASSET_BUILD_DIR']
+    path, vary = entry['path'], ['Accept-Encoding'] if entry['encodings'] else []
+    mimetype = mimetypes.guess_type(path)[0]
+    if entry['webp']:
+        vary.append('Accept')
+        if request.accept_mimetypes['image/webp'] > 0:
+            path, mimetype = entry['webp'], 'image/webp'
+
+    encoding = next((encoding for encoding in entry['encodings'] if _accepts(encoding)), None)
+    if path == entry['path'] and encoding:
+        response = send_from_directory(
+            build_dir, f'{path}.{"br" if encoding == "br" else "gz"}', mimetype=mimetype, max_age=max_age
+        )
+        response.headers['Content-Encoding'] = encoding
+    else:
+        response = send_from_directory(build_dir, path, mimetype=mimetype, max_age=max_age)
+    response.vary.update(vary)
+    return response
+
+
+def send_asset(filename):
+    """Send a fingerprinted asset by its built name, cached for a year; None if unknown"""
+    entry = None if current_app.debug else _current_manifest()[2].get(filename)
+    if entry is None:
+        return None
+    response = send_built_file(entry, IMMUTABLE_MAX_AGE)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+def send_page(name):
+    """Send a built HTML page, revalidated on every load; None if not built"""
+    entry = asset_manifest().get(name)
+    if entry is None:
+        return None
+    response = send_built_file(entry, None)
+    response.cache_control.no_cache = True
+    return response
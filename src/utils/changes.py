@@ -0,0 +1,79 @@
+"""Change feed behind GET /api/patients/changes.
+
+Triggers on patients record every change in patient_changes, in the same
+transaction as the change itself, so ORM writes, the set-based queue
+UPDATEs and raw SQL are all covered. Only a new value in a column the API
+returns counts as a change; maintenance updates such as the search key
+backfill do not.
+SQLite has a single writer, so seq order is commit order and a client that
+resumes from the last seq it saw cannot miss a change.
+"""
+from src.models.patient import Patient
+from src.models.patient_change import PatientChange
+from src.models.user import db
+from src.utils.serializer import patient_serializer
+
+_RECORD = "INSERT OR REPLACE INTO patient_changes (patient_id, deleted) VALUES ({row}.id, {deleted});"
+
+
+def _trigger_statements():
+    watched = [column.key for column in Patient.columns_for_fields(Patient.API_FIELDS)]
+    # UPDATE OF fires whenever a column is SET, even to its current value
+    changed = ' OR '.join(f'OLD.{name} IS NOT NEW.{name}' for name in watched)
+    return [
+        'CREATE TRIGGER IF NOT EXISTS trg_patients_changes_insert AFTER INSERT ON patients '
+        f"BEGIN {_RECORD.format(row='NEW', deleted=0)} END",
+        f"CREATE TRIGGER IF NOT EXISTS trg_patients_changes_update AFTER UPDATE OF {', '.join(watched)} ON patients "
+        f"WHEN {changed} BEGIN {_RECORD.format(row='NEW', deleted=0)} END",
+        'CREATE TRIGGER IF NOT EXISTS trg_patients_changes_delete AFTER DELETE ON patients '
+        f"BEGIN {_RECORD.format(row='OLD', deleted=1)} END",
+    ]
+
+
+def install_change_feed():
+    """Create the change feed triggers and seed it with existing patients on first run"""
+    for statement in _trigger_statements():
+        db.session.execute(db.text(statement))
+    if PatientChange.query.first() is None:
+        db.session.execute(db.insert(PatientChange).from_select(
+            ['patient_id', 'deleted'],
+            db.select(Patient.id, db.false()).order_by(Patient.updated_at, Patient.id)
+        ))
+    db.session.commit()
+
+
+def parse_since(value):
+    """Read the since cursor of a changes request (0 = from the beginning)"""
+    if not value:
+        return 0
+    try:
+        since = int(value)
+    except ValueError:
+        raise ValueError('since must be a cursor returned by this endpoint')
+    if since < 0:
+        raise ValueError('since must be a cursor returned by this endpoint')
+    return since
+
+
+def changes_since(since, limit, fields=None):
+    """Patients changed after the since cursor, oldest change first.
+
+    Returns (changed patients as dicts for json_response, projected to
+    fields if given; ids of deleted patients; the cursor to resume from;
+    whether more changes remain).
+    """
+    serializer = patient_serializer(fields)
+    rows = db.session.query(
+        *serializer.columns, PatientChange.seq, PatientChange.patient_id, PatientChange.deleted
+    ).outerjoin(
+        Patient, Patient.id == PatientChange.patient_id
+    ).filter(
+        PatientChange.seq > since
+    ).order_by(PatientChange.seq).limit(limit + 1).all()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    changed = [serializer.to_dict(row) for row in rows if not row.deleted]
+    deleted = [row.patient_id for row in rows if row.deleted]
+    cursor = rows[-1].seq if rows else since
+    return changed, deleted, str(cursor), has_more
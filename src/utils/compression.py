@@ -0,0 +1,100 @@
+"""gzip/deflate compression of API responses.
+
+An after_request hook compresses responses whose type is in
+COMPRESS_MIMETYPES when the client accepts gzip or deflate. Buffered
+bodies shorter than COMPRESS_MIN_SIZE are left alone, since the headers
+would cost more than the saving. Streamed bodies, such as the registry
+export, are compressed chunk by chunk and each chunk is flushed, so they
+still arrive as they are generated.
+
+Some responses are never touched: file sends (PDFs, built static files),
+responses that already have a Content-Encoding, and anything outside the
+allowlist, including the Server-Sent Events stream, which must not be
+buffered. A compressed response's ETag is made weak, as the bytes differ
+from the uncompressed representation; conditional_get compares ETags
+weakly, so clients still get their 304s.
+"""
+import gzip
+import zlib
+
+from flask import current_app, request
+
+DEFAULT_LEVEL = 6
+DEFAULT_MIN_SIZE = 1024
+DEFAULT_MIMETYPES = (
+    'application/json', 'application/x-ndjson', 'text/csv',
+    'text/html', 'text/plain', 'text/css', 'application/javascript',
+)
+
+# Preferred first when the client accepts both equally
+ENCODINGS = ('gzip', 'deflate')
+
+
+def _wbits(encoding):
+    return 31 if encoding == 'gzip' else 15  # 31: gzip container, 15: zlib (HTTP "deflate")
+
+
+def compress(data, encoding, level=DEFAULT_LEVEL):
+    """Compress a whole body with the given content coding"""
+    if encoding == 'gzip':
+        return gzip.compress(data, compresslevel=level, mtime=0)
+    return zlib.compress(data, level)
+
+
+def _compress_stream(chunks, encoding, level):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, _wbits(encoding))
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode()
+            data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            if data:
+                yield data
+        yield compressor.flush()
+    finally:
+        # The wrapped iterable (e.g. stream_with_context) may hold resources
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
+
+def _accepted_encoding():
+    encoding = request.accept_encodings.best_match(ENCODINGS)
+    return encoding if encoding and request.accept_encodings[encoding] > 0 else None
+
+
+def compress_response(response):
+    """after_request hook: compress the response body if worthwhile"""
+    config = current_app.config
+    if (
+        response.status_code < 200 or response.status_code in (204, 206, 304)
+        or response.direct_passthrough
+        or 'Content-Encoding' in response.headers
+        or response.mimetype not in config.get('COMPRESS_MIMETYPES', DEFAULT_MIMETYPES)
+    ):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = _accepted_encoding()
+    if encoding is None or request.method == 'HEAD':
+        return response
+
+    level = config.get('COMPRESS_LEVEL', DEFAULT_LEVEL)
+    if response.is_streamed:
+        response.response = _compress_stream(response.response, encoding, level)
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < config.get('COMPRESS_MIN_SIZE', DEFAULT_MIN_SIZE):
+            return response
+        response.set_data(compress(data, encoding, level))
+    response.headers['Content-Encoding'] = encoding
+
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def install_compression(app):
+    """Compress the app's responses (see compress_response)"""
+    app.after_request(compress_response)
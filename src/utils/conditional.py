@@ -0,0 +1,73 @@
+"""ETags and 304 Not Modified for the read endpoints.
+
+Each endpoint names a version function: a single indexed lookup (or a
+cached value) that changes whenever its response would, such as the last
+seq of the patient change feed (see src/utils/changes.py) or the clinic
+config's updated_at (see src/utils/config_cache.py). The version is read
+before the view runs, so a poll that already has the current
+representation gets a 304 without the main query or any JSON
+serialization. A write landing between the version lookup and the view's
+query only makes the ETag older than the body, which costs the client one
+extra full response and never hides a change.
+"""
+from datetime import date
+import functools
+
+from flask import current_app, make_response, request
+
+from src.models.patient_change import PatientChange
+from src.models.user import db
+from src.utils.config_cache import config_version
+
+
+def patients_version(**view_args):
+    """Changes with every visible change to any patient"""
+    return db.session.query(db.func.max(PatientChange.seq)).scalar() or 0
+
+
+def patients_version_today(**view_args):
+    """patients_version for responses that also depend on today's date"""
+    return f'{patients_version()}-{date.today().isoformat()}'
+
+
+def patient_version(patient_id, **view_args):
+    """Changes with every visible change to one patient; None if it does not exist"""
+    return db.session.query(PatientChange.seq).filter(
+        PatientChange.patient_id == patient_id,
+        PatientChange.deleted.is_(False)
+    ).scalar()
+
+
+def clinic_config_version(**view_args):
+    """Changes with every update of the clinic configuration"""
+    return config_version()
+
+
+def conditional_get(version):
+    """Give a GET view an ETag built from version(**view_args).
+
+    A request whose If-None-Match already names the current version gets a
+    304 without calling the view. Without a version (None) the view runs as
+    usual and no ETag is sent.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            current = version(**kwargs)
+            if current is None:
+                return view(*args, **kwargs)
+
+            etag = f'{view.__name__}-{current}'
+            # Weak comparison: the ETag is sent weak when the body is compressed
+            if request.if_none_match.contains_weak(etag):
+                response = current_app.response_class(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            # Reuse only after checking with the server
+            response.cache_control.no_cache = True
+            return response
+        return wrapper
+    return decorator
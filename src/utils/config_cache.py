@@ -0,0 +1,46 @@
+"""Process-local cache of the clinic configuration.
+
+The config is read by every SPA load, every report and every conditional
+GET of /api/clinic/config, but changes only when an admin edits it. Readers
+get a snapshot (ClinicConfig.to_dict()) held in this process. The process
+that commits an update drops its snapshot at once. Other server processes
+compare the snapshot with the config row's updated_at, its version, at
+most every CLINIC_CONFIG_RECHECK seconds, and reload it if it moved.
+Between checks a config read never touches the database.
+"""
+import time
+
+from flask import current_app
+
+from src.models.clinic_config import ClinicConfig
+
+DEFAULT_RECHECK = 5
+
+_snapshot = None  # (next check, config dict)
+
+
+def clinic_config():
+    """The clinic configuration as a dict (see ClinicConfig.to_dict)"""
+    global _snapshot
+    snapshot = _snapshot
+    now = time.monotonic()
+    if snapshot is not None and snapshot[0] > now:
+        return snapshot[1]
+
+    config = snapshot[1] if snapshot is not None else None
+    version = ClinicConfig.version()
+    if config is None or version is None or config['updated_at'] != version.isoformat():
+        config = ClinicConfig.get_config().to_dict()
+    _snapshot = (now + current_app.config.get('CLINIC_CONFIG_RECHECK', DEFAULT_RECHECK), config)
+    return config
+
+
+def config_version():
+    """updated_at of the cached configuration, in ISO format"""
+    return clinic_config()['updated_at']
+
+
+def invalidate_clinic_config():
+    """Forget the cached configuration; call after committing a change"""
+    global _snapshot
+    _snapshot = None
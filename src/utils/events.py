@@ -0,0 +1,120 @@
+"""Queue change events behind the /api/events Server-Sent Events stream.
+
+Every stream follows the patient change feed (see src/utils/changes.py)
+and sends the queue fields of the patients changed since its last event,
+e.g.
+
+    id: 1042
+    event: patients
+    data: {"deleted":[],"patient_ids":[3,7],"patients":{"3":{"status":"in_hall",...},"7":{...}}}
+
+so open screens patch the rows they already have instead of re-fetching
+the lists. The feed is in the database, so a change made through any
+server process reaches every screen: each stream checks the feed every
+POLL_INTERVAL seconds. The routes that change the queue also wake the
+streams of their own process right after they commit, so screens
+connected to that process see the change at once.
+
+The event id is the feed cursor, so a reconnecting EventSource
+(Last-Event-ID) gets every patient changed while it was away. A stream
+more than MAX_EVENT_PATIENTS patients behind, or resuming from an id the
+feed did not issue, is sent a "resync" event and should reload
+everything.
+
+An open stream holds one server thread for as long as the screen stays
+open, so each process serves at most EVENT_STREAMS_PER_WORKER streams and
+answers further ones with 503, leaving its other threads for requests.
+"""
+import threading
+
+from src.utils.changes import changes_since
+from src.utils.conditional import patients_version
+from src.utils.serializer import dumps
+
+# Patient fields the queue screens show, as named by Patient.to_dict()
+QUEUE_FIELDS = ('visit_datetime', 'visit_type', 'hall_status', 'status', 'doctor_comments')
+
+# Seconds between checks for changes made through other processes
+POLL_INTERVAL = 1
+# Patients per event; a stream further behind is told to resync
+MAX_EVENT_PATIENTS = 500
+# Open streams per process, unless EVENT_STREAMS_PER_WORKER says otherwise
+DEFAULT_MAX_STREAMS = 4
+# Seconds a stream turned away with 503 should wait before trying again
+BUSY_RETRY = 10
+
+_changed = threading.Condition()
+_generation = 0
+_streams_lock = threading.Lock()
+_open_streams = 0
+
+
+def open_stream(limit):
+    """Take a stream slot; False if limit streams are already open"""
+    global _open_streams
+    with _streams_lock:
+        if _open_streams >= limit:
+            return False
+        _open_streams += 1
+        return True
+
+
+def close_stream():
+    """Give back a slot taken by open_stream"""
+    global _open_streams
+    with _streams_lock:
+        _open_streams -= 1
+
+
+def notify_queue_change():
+    """Wake this process's event streams; call after committing a queue change"""
+    global _generation
+    with _changed:
+        _generation += 1
+        _changed.notify_all()
+
+
+def change_generation():
+    """The current wake-up generation, for wait_for_change"""
+    with _changed:
+        return _generation
+
+
+def wait_for_change(generation, timeout):
+    """Wait until notify_queue_change is called after generation, or timeout.
+
+    Returns the generation to wait from next.
+    """
+    with _changed:
+        _changed.wait_for(lambda: _generation != generation, timeout)
+        return _generation
+
+
+def format_event(event_id, event, data):
+    return f"id: {event_id}\nevent: {event}\ndata: {dumps(data).decode()}\n\n"
+
+
+def parse_last_event_id(value):
+    """The feed cursor of a Last-Event-ID header; None if it is not one"""
+    if value and value.isdigit():
+        return int(value)
+    return None
+
+
+def next_event(cursor):
+    """The event for the feed's changes after cursor.
+
+    Returns (the event, or None if nothing changed; the cursor to continue
+    from). Needs an app context.
+    """
+    changed, deleted, next_cursor, has_more = changes_since(cursor, MAX_EVENT_PATIENTS, ('id',) + QUEUE_FIELDS)
+    if has_more:
+        latest = patients_version()
+        return format_event(latest, 'resync', {}), latest
+    if not changed and not deleted:
+        return None, cursor
+    return format_event(next_cursor, 'patients', {
+        'patient_ids': [patient['id'] for patient in changed],
+        'patients': {str(patient['id']): {field: patient[field] for field in QUEUE_FIELDS} for patient in changed},
+        'deleted': deleted,
+    }), int(next_cursor)
@@ -0,0 +1,103 @@
+"""Streaming export of the patient registry (GET /api/patients/export).
+
+Rows are read with yield_per, so SQLite hands them over one batch at a
+time, and each batch is encoded and sent before the next is read: memory
+stays flat however many patients are exported. NDJSON lines are the same
+objects /api/patients returns; CSV has one column per API field, with
+dates in ISO format. Either can be gzipped on the fly.
+"""
+import csv
+from datetime import date, datetime
+import io
+import zlib
+
+from src.models.patient import Patient
+from src.models.user import db
+from src.utils.serializer import dumps, patient_serializer
+
+BATCH_SIZE = 1000
+
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+# Query parameter: (column, bound), for half-open [from, to) ranges
+RANGE_FILTERS = {
+    'created_from': (Patient.created_at, 'from'),
+    'created_to': (Patient.created_at, 'to'),
+    'visit_from': (Patient.visit_datetime, 'from'),
+    'visit_to': (Patient.visit_datetime, 'to'),
+}
+
+
+def export_criteria(args):
+    """Filters for the created_*/visit_* range parameters (ISO dates or datetimes)"""
+    criteria = []
+    for name, (column, bound) in RANGE_FILTERS.items():
+        value = args.get(name)
+        if not value:
+            continue
+        try:
+            moment = datetime.fromisoformat(value)
+        except ValueError:
+            raise ValueError(f'{name} must be an ISO 8601 date or datetime')
+        criteria.append(column >= moment if bound == 'from' else column < moment)
+    return criteria
+
+
+def _batches(criteria, batch_size):
+    serializer = patient_serializer()
+    result = db.session.execute(
+        db.select(*serializer.columns)
+        .where(*criteria)
+        .order_by(Patient.id)
+        .execution_options(yield_per=batch_size)
+    )
+    for rows in result.partitions():
+        yield serializer.to_dicts(rows)
+
+
+def _ndjson_chunks(batches):
+    for items in batches:
+        yield b''.join(dumps(item) + b'\n' for item in items)
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, date):  # date and datetime
+        return value.isoformat()
+    return value
+
+
+def _csv_chunks(batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # The byte order mark makes spreadsheet programs read the file as UTF-8
+    buffer.write('\ufeff')
+    writer.writerow(Patient.API_FIELDS)
+    for items in batches:
+        for item in items:
+            writer.writerow([_csv_value(item[field]) for field in Patient.API_FIELDS])
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():  # nothing exported: still send the header
+        yield buffer.getvalue().encode()
+
+
+def _gzip_chunks(chunks):
+    compressor = zlib.compressobj(wbits=31)  # 31: gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_chunks(output, criteria, compress=False, batch_size=BATCH_SIZE):
+    """Generate the export body in the given format, optionally gzipped"""
+    batches = _batches(criteria, batch_size)
+    chunks = _csv_chunks(batches) if output == 'csv' else _ndjson_chunks(batches)
+    return _gzip_chunks(chunks) if compress else chunks
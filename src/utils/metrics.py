@@ -0,0 +1,371 @@
+"""Request, SQL and report-rendering metrics in the Prometheus text format.
+
+Every request records its latency, response size (as sent, after
+compression), number of SQL statements and time spent in them, labelled
+by endpoint ("patient.get_all_patients"); report renders record their time by
+report kind. GET /api/metrics returns them for a Prometheus scraper.
+
+Requests slower than METRICS_SLOW_REQUEST seconds are logged with their
+METRICS_SLOW_SQL slowest statements. Statements are logged without their
+parameters, which hold patient data.
+
+Metrics live in the memory of each process. Under gunicorn every worker
+also writes them to a shared directory every few seconds, the master folds
+the metrics of exited workers into an archive there (see gunicorn.conf.py),
+and the worker answering a scrape adds them all up, so the totals cover
+the whole server whichever worker is asked.
+"""
+import bisect
+import functools
+import heapq
+import itertools
+import json
+import os
+import threading
+import time
+
+from flask import current_app, g, has_app_context, request
+from sqlalchemy import event
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+STATEMENT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 500, 1000)
+
+# name: (type, help, histogram buckets)
+METRICS = {
+    'clinic_http_requests_total': (
+        'counter', 'Requests served, by endpoint, method and status', None),
+    'clinic_http_request_duration_seconds': (
+        'histogram', 'Time from the start of a request to the end of its response', LATENCY_BUCKETS),
+    'clinic_http_response_size_bytes': (
+        'histogram', 'Response body bytes as sent, after compression', SIZE_BUCKETS),
+    'clinic_db_statements_per_request': (
+        'histogram', 'SQL statements executed per request', STATEMENT_BUCKETS),
+    'clinic_db_duration_seconds': (
+        'histogram', 'Time per request spent executing SQL statements', LATENCY_BUCKETS),
+    'clinic_slow_requests_total': (
+        'counter', 'Requests slower than METRICS_SLOW_REQUEST seconds', None),
+    'clinic_pdf_render_seconds': (
+        'histogram', 'Time to render a report PDF, by report kind', LATENCY_BUCKETS),
+}
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+DEFAULT_SLOW_REQUEST = 1.0
+DEFAULT_SLOW_SQL = 5
+# Logged statements are cut to this many characters
+MAX_SQL_LENGTH = 300
+
+# Seconds between a worker's writes to the shared directory
+FLUSH_INTERVAL = 5
+ARCHIVE_NAME = 'archive.json'
+
+_lock = threading.Lock()
+# (name, labels): [value] for counters, [count per bucket..., +Inf count, sum] for histograms
+_series = {}
+_shared = None  # (directory, file name) of this process under gunicorn
+_statement_ids = itertools.count()  # keeps the slowest-statement heap from comparing strings
+
+
+def _inc(name, labels, amount=1):
+    with _lock:
+        series = _series.setdefault((name, labels), [0])
+        series[0] += amount
+
+
+def _observe(name, labels, value):
+    buckets = METRICS[name][2]
+    index = bisect.bisect_left(buckets, value)  # the first bucket with value <= le
+    with _lock:
+        series = _series.get((name, labels))
+        if series is None:
+            series = _series[(name, labels)] = [0] * (len(buckets) + 2)
+        series[index] += 1
+        series[-1] += value
+
+
+def observe_render(kind, seconds):
+    """Record the time taken to render one report PDF of the given kind"""
+    _observe('clinic_pdf_render_seconds', (('report', kind),), seconds)
+
+
+def time_render(kind, render, *args):
+    """Call render(*args) in this thread, recording its duration; returns its result"""
+    start = time.perf_counter()
+    pdf = render(*args)
+    observe_render(kind, time.perf_counter() - start)
+    return pdf
+
+
+class _RequestMetrics:
+    """SQL statements executed while serving one request"""
+
+    def __init__(self, keep_slowest):
+        self.start = time.perf_counter()
+        self.statements = 0
+        self.db_seconds = 0.0
+        self.keep_slowest = keep_slowest
+        self.slowest = []  # heap of (seconds, id, statement)
+
+    def add_statement(self, statement, seconds):
+        self.statements += 1
+        self.db_seconds += seconds
+        if self.keep_slowest:
+            entry = (seconds, next(_statement_ids), statement)
+            if len(self.slowest) < self.keep_slowest:
+                heapq.heappush(self.slowest, entry)
+            else:
+                heapq.heappushpop(self.slowest, entry)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._metrics_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, '_metrics_start', None)
+    # Statements outside requests (report job threads, CLI commands) are not tracked
+    tracker = g.get('request_metrics') if has_app_context() else None
+    if start is not None and tracker is not None:
+        tracker.add_statement(statement, time.perf_counter() - start)
+
+
+def start_request():
+    """before_request hook: start timing the request"""
+    g.request_metrics = _RequestMetrics(current_app.config.get('METRICS_SLOW_SQL', DEFAULT_SLOW_SQL))
+
+
+def _log_slow_request(tracker, method, path, endpoint, status, elapsed):
+    lines = [
+        f"Slow request: {method} {path} ({endpoint}) {status} took {elapsed:.3f}s, "
+        f"{tracker.statements} SQL statements in {tracker.db_seconds:.3f}s"
+    ]
+    for seconds, _, statement in sorted(tracker.slowest, reverse=True):
+        statement = ' '.join(statement.split())
+        if len(statement) > MAX_SQL_LENGTH:
+            statement = statement[:MAX_SQL_LENGTH] + '...'
+        lines.append(f"  {seconds:.3f}s {statement}")
+    print('\n'.join(lines))
+
+
+def _finish_request(tracker, method, path, endpoint, status, slow_request, size):
+    elapsed = time.perf_counter() - tracker.start
+    labels = (('endpoint', endpoint),)
+    _inc('clinic_http_requests_total', labels + (('method', method), ('status', str(status))))
+    if size is None:
+        return
+    _observe('clinic_http_request_duration_seconds', labels + (('method', method),), elapsed)
+    _observe('clinic_http_response_size_bytes', labels, size)
+    _observe('clinic_db_statements_per_request', labels, tracker.statements)
+    _observe('clinic_db_duration_seconds', labels, tracker.db_seconds)
+    if slow_request and elapsed >= slow_request:
+        _inc('clinic_slow_requests_total', labels)
+        _log_slow_request(tracker, method, path, endpoint, status, elapsed)
+
+
+def _count_bytes(chunks, sent):
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode()
+            sent[0] += len(chunk)
+            yield chunk
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
+
+def record_response(response):
+    """after_request hook: record the request once its response has been sent"""
+    tracker = g.get('request_metrics')
+    if tracker is None:
+        return response
+    finish = functools.partial(
+        _finish_request, tracker, request.method, request.path, request.endpoint or 'unmatched',
+        response.status_code, current_app.config.get('METRICS_SLOW_REQUEST', DEFAULT_SLOW_REQUEST)
+    )
+
+    if response.mimetype == 'text/event-stream':
+        # Open for as long as the screen is; only counted
+        finish(None)
+    elif response.direct_passthrough:
+        # File sends are handed to the server as they are and never report
+        # their end, so they are timed up to here
+        finish(response.content_length or 0)
+    elif response.is_streamed:
+        # Streamed bodies still run their queries while being sent
+        sent = [0]
+        response.response = _count_bytes(response.response, sent)
+        response.call_on_close(lambda: finish(sent[0]))
+    else:
+        size = response.calculate_content_length() or 0
+        response.call_on_close(lambda: finish(size))
+    return response
+
+
+def install_metrics(app, engine):
+    """Record the app's requests and the SQL statements run on engine.
+
+    Call before install_compression, so the response sizes are those of the
+    compressed bodies (after_request hooks run in reverse order).
+    """
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+    app.before_request(start_request)
+    app.after_request(record_response)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+
+def _number(value):
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def render_metrics(series):
+    """Format {(name, labels): values} in the Prometheus text format"""
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        rows = sorted((labels, values) for (series_name, labels), values in series.items() if series_name == name)
+        for labels, values in rows:
+            if kind == 'counter':
+                lines.append(f'{name}{_format_labels(labels)} {_number(values[0])}')
+                continue
+            count = 0
+            for bound, bucket_count in zip(buckets + ('+Inf',), values):
+                count += bucket_count
+                lines.append(f'{name}_bucket{_format_labels(labels + (("le", _number(bound)),))} {count}')
+            lines.append(f'{name}_sum{_format_labels(labels)} {_number(values[-1])}')
+            lines.append(f'{name}_count{_format_labels(labels)} {count}')
+    return '\n'.join(lines) + '\n'
+
+
+def _snapshot():
+    with _lock:
+        return {key: list(values) for key, values in _series.items()}
+
+
+def _merge(into, series):
+    for key, values in series.items():
+        total = into.get(key)
+        if total is None:
+            into[key] = list(values)
+        elif len(total) == len(values):
+            into[key] = [a + b for a, b in zip(total, values)]
+
+
+def _dump(series):
+    return [[name, [list(label) for label in labels], values] for (name, labels), values in series.items()]
+
+
+def _parse(rows):
+    return {(name, tuple(tuple(label) for label in labels)): values for name, labels, values in rows}
+
+
+def _read(path):
+    with open(path) as source:
+        return json.load(source)
+
+
+def _write(path, data):
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w') as target:
+        json.dump(data, target)
+    os.replace(tmp_path, path)
+
+
+def _shared_series(directory, own_name):
+    # Worker files first, then the archive: a file archived in between is
+    # then listed in the archive and skipped, never counted twice or lost
+    workers = {}
+    for name in os.listdir(directory):
+        if name.startswith('worker-') and name.endswith('.json') and name != own_name:
+            try:
+                workers[name] = _read(os.path.join(directory, name))
+            except (FileNotFoundError, ValueError):
+                continue
+    try:
+        archive = _read(os.path.join(directory, ARCHIVE_NAME))
+    except FileNotFoundError:
+        archive = {'workers': [], 'series': []}
+
+    series = _parse(archive['series'])
+    for name, rows in workers.items():
+        if name not in archive['workers']:
+            _merge(series, _parse(rows))
+    return series
+
+
+def metrics_text():
+    """This server's metrics in the Prometheus text format"""
+    series = _snapshot()
+    if _shared is not None:
+        _merge(series, _shared_series(*_shared))
+    return render_metrics(series)
+
+
+def reset_shared_metrics(directory):
+    """Empty the shared directory when the server starts (call in the server master)"""
+    os.makedirs(directory, exist_ok=True)
+    for name in os.listdir(directory):
+        if name.endswith('.json'):
+            os.remove(os.path.join(directory, name))
+
+
+def flush_metrics():
+    """Write this process's metrics to the shared directory, if it has one"""
+    if _shared is not None:
+        directory, name = _shared
+        _write(os.path.join(directory, name), _dump(_snapshot()))
+
+
+def _flush_periodically():
+    while True:
+        time.sleep(FLUSH_INTERVAL)
+        try:
+            flush_metrics()
+        except OSError as e:
+            print(f"Error writing metrics: {e}")
+
+
+def share_metrics(directory):
+    """Share this process's metrics through directory (call in each server worker)"""
+    global _shared
+    os.makedirs(directory, exist_ok=True)
+    _shared = (directory, f'worker-{os.getpid()}-{time.time_ns()}.json')
+    threading.Thread(target=_flush_periodically, name='metrics-flush', daemon=True).start()
+
+
+def archive_worker_metrics(directory, pid):
+    """Fold an exited worker's metrics into the archive (call in the server master)"""
+    prefix = f'worker-{pid}-'
+    names = [name for name in os.listdir(directory) if name.startswith(prefix) and name.endswith('.json')]
+    if not names:
+        return
+    archive_path = os.path.join(directory, ARCHIVE_NAME)
+    try:
+        archive = _read(archive_path)
+    except FileNotFoundError:
+        archive = {'workers': [], 'series': []}
+
+    series = _parse(archive['series'])
+    for name in names:
+        try:
+            _merge(series, _parse(_read(os.path.join(directory, name))))
+        except ValueError:
+            continue
+    present = set(os.listdir(directory))
+    workers = [name for name in archive['workers'] if name in present] + names
+    _write(archive_path, {'workers': workers, 'series': _dump(series)})
+    for name in names:
+        os.remove(os.path.join(directory, name))
@@ -0,0 +1,90 @@
+"""Name normalization and phonetic keys for Arabic and Latin names.
+
+normalize_name() folds the spelling variants the front desk produces for the
+same name (diacritics, hamza/alef forms, yaa/alef maqsura, taa marbuta, case)
+so a search matches regardless of how the name was typed.
+
+phonetic_key() goes one step further and reduces each word to a consonant
+skeleton that is shared between an Arabic spelling and its common Latin
+transliterations, e.g. "محمد", "Mohamed" and "Muhammad" all give "MHMD".
+"""
+import re
+import unicodedata
+
+# Letters NFKD does not fold on its own. Hamza forms (أ إ آ ؤ ئ) decompose
+# into a base letter plus a combining mark, which is stripped below.
+_ARABIC_FOLDS = str.maketrans({
+    'ٱ': 'ا',  # alef wasla
+    'ى': 'ي',  # alef maqsura
+    'ی': 'ي',  # farsi yeh
+    'ة': 'ه',  # taa marbuta
+    'ک': 'ك',  # keheh
+    'ـ': None,  # tatweel
+    'ء': None,  # standalone hamza
+    **{chr(0x0660 + digit): str(digit) for digit in range(10)},  # Arabic-Indic digits
+    **{chr(0x06F0 + digit): str(digit) for digit in range(10)},  # Eastern Arabic-Indic digits
+})
+
+_NON_WORD = re.compile(r'[^\w]+')
+
+# Arabic letters to the Latin spelling most often used when transliterating
+# names, so both scripts share one phonetic alphabet.
+_TRANSLITERATION = str.maketrans({
+    'ا': 'a', 'ب': 'b', 'ت': 't', 'ث': 'th', 'ج': 'j', 'ح': 'h', 'خ': 'kh',
+    'د': 'd', 'ذ': 'dh', 'ر': 'r', 'ز': 'z', 'س': 's', 'ش': 'sh', 'ص': 's',
+    'ض': 'd', 'ط': 't', 'ظ': 'z', 'ع': 'a', 'غ': 'gh', 'ف': 'f', 'ق': 'q',
+    'ك': 'k', 'ل': 'l', 'م': 'm', 'ن': 'n', 'ه': 'h', 'و': 'w', 'ي': 'y',
+})
+
+# Latin spellings to phonetic symbols, longest match first. Lowercase
+# output letters are vowels/semivowels and are dropped after the first
+# position; uppercase ones are kept.
+_LATIN_SOUNDS = (
+    ('kh', 'X'), ('gh', 'G'), ('sh', 'C'), ('ch', 'C'), ('th', 'S'),
+    ('dh', 'Z'), ('ph', 'F'), ('ck', 'K'),
+    ('a', 'a'), ('e', 'a'), ('i', 'a'), ('o', 'a'), ('u', 'a'),
+    ('y', 'y'), ('w', 'w'),
+    ('b', 'B'), ('p', 'B'), ('c', 'K'), ('d', 'D'), ('f', 'F'), ('v', 'F'),
+    ('g', 'J'), ('j', 'J'), ('h', 'H'), ('k', 'K'), ('q', 'K'), ('l', 'L'),
+    ('m', 'M'), ('n', 'N'), ('r', 'R'), ('s', 'S'), ('t', 'T'), ('x', 'KS'),
+    ('z', 'Z'),
+)
+_SOUND_PATTERN = re.compile('|'.join(re.escape(spelling) for spelling, _ in _LATIN_SOUNDS))
+_SOUNDS = dict(_LATIN_SOUNDS)
+
+
+def normalize_name(text):
+    """Fold a name to its searchable form: lowercase, no diacritics, single spaces"""
+    if not text:
+        return ''
+    decomposed = unicodedata.normalize('NFKD', text.translate(_ARABIC_FOLDS))
+    stripped = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    folded = stripped.translate(_ARABIC_FOLDS).casefold()
+    return ' '.join(_NON_WORD.sub(' ', folded).replace('_', ' ').split())
+
+
+def _word_code(word):
+    symbols = [_SOUNDS[match] for match in _SOUND_PATTERN.findall(word.translate(_TRANSLITERATION))]
+    if not symbols:
+        return word.upper() if word.isdigit() else ''
+
+    # Collapse doubled sounds (Mohammed, Youssef, shadda already stripped)
+    collapsed = [symbols[0]]
+    for symbol in symbols[1:]:
+        if symbol != collapsed[-1]:
+            collapsed.append(symbol)
+
+    # A leading vowel is kept as 'A' (Ahmed/احمد, Omar/عمر); a leading y/w is
+    # a consonant (Youssef/يوسف, Walid/وليد). Later vowels are dropped.
+    first = collapsed[0]
+    code = [{'a': 'A', 'y': 'Y', 'w': 'W'}.get(first, first)]
+    code.extend(symbol for symbol in collapsed[1:] if symbol.isupper())
+    # A trailing h is usually a silent taa marbuta or spelling aid (Fatmah/فاطمة)
+    if len(code) > 1 and code[-1] == 'H':
+        code.pop()
+    return ''.join(code)
+
+
+def phonetic_key(text):
+    """Phonetic code for each word of a name, space separated"""
+    return ' '.join(filter(None, (_word_code(word) for word in normalize_name(text).split())))
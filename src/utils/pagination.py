@@ -0,0 +1,138 @@
+"""Keyset (cursor) pagination and field projection for list endpoints"""
+import base64
+from datetime import datetime
+
+from src.models.patient import Patient
+from src.models.user import db
+from src.utils.serializer import patient_serializer
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+
+class PageArgs:
+    """Parsed paging/projection query parameters for a list request"""
+
+    def __init__(self, limit=None, cursor=None, fields=None, with_total=False):
+        self.limit = limit
+        self.cursor = cursor
+        self.fields = fields
+        self.with_total = with_total
+
+    @property
+    def paged(self):
+        return self.limit is not None
+
+
+def encode_cursor(sort_value, row_id):
+    """Encode the (sort value, id) of the last row on a page as an opaque token"""
+    raw = f"{sort_value.isoformat() if sort_value else ''}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Decode a cursor produced by encode_cursor"""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        sort_raw, id_raw = base64.urlsafe_b64decode(padded.encode()).decode().split('|')
+        sort_value = datetime.fromisoformat(sort_raw) if sort_raw else None
+        return sort_value, int(id_raw)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError('Invalid cursor')
+
+
+def parse_page_args(args, allowed_fields=Patient.API_FIELDS, paged_by_default=False):
+    """Read limit/cursor/fields/count from the request query string.
+
+    Paging is opt-in for the patient lists: without ``limit`` or ``cursor``
+    they return the full list, as they always have. Newer endpoints pass
+    paged_by_default=True to always page. ``fields`` is accepted only when
+    allowed_fields is non-empty.
+    """
+    limit = args.get('limit')
+    cursor = args.get('cursor')
+    if limit is not None or cursor or paged_by_default:
+        try:
+            limit = int(limit) if limit is not None else DEFAULT_PAGE_SIZE
+        except ValueError:
+            raise ValueError('limit must be an integer')
+        if limit < 1:
+            raise ValueError('limit must be positive')
+        limit = min(limit, MAX_PAGE_SIZE)
+
+    fields = None
+    fields_arg = args.get('fields', '').strip()
+    if fields_arg:
+        if not allowed_fields:
+            raise ValueError('fields is not supported by this endpoint')
+        requested = {name.strip() for name in fields_arg.split(',') if name.strip()}
+        unknown = requested.difference(allowed_fields)
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+        requested.add('id')
+        fields = [name for name in allowed_fields if name in requested]
+
+    with_total = args.get('count', '').lower() in ('1', 'true', 'yes')
+    return PageArgs(
+        limit=limit,
+        cursor=decode_cursor(cursor) if cursor else None,
+        fields=fields,
+        with_total=with_total
+    )
+
+
+def keyset_page(query, page_args, sort_column, id_column):
+    """Apply cursor, (sort_column, id_column) descending order and limit.
+
+    Returns ``(rows, headers)`` where headers carry ``X-Next-Cursor`` (when
+    more rows exist) and ``X-Total-Count`` (only when the client asked for
+    it with ``count=1``).
+    """
+    headers = {}
+    if page_args.with_total:
+        headers['X-Total-Count'] = str(query.order_by(None).count())
+
+    if page_args.cursor:
+        sort_value, last_id = page_args.cursor
+        if sort_value is None:
+            query = query.filter(sort_column.is_(None), id_column < last_id)
+        else:
+            query = query.filter(db.or_(
+                sort_column < sort_value,
+                db.and_(sort_column == sort_value, id_column < last_id),
+                sort_column.is_(None)
+            ))
+
+    query = query.order_by(sort_column.desc(), id_column.desc())
+
+    if not page_args.paged:
+        return query.all(), headers
+
+    rows = query.limit(page_args.limit + 1).all()
+    if len(rows) > page_args.limit:
+        rows = rows[:page_args.limit]
+        last = rows[-1]
+        headers['X-Next-Cursor'] = encode_cursor(
+            getattr(last, sort_column.key), getattr(last, id_column.key)
+        )
+    return rows, headers
+
+
+def paginate_patients(page_args, sort_column, *criteria):
+    """Run a patient list query ordered by (sort_column, id) descending.
+
+    Selects column tuples rather than Patient objects. Returns ``(items,
+    headers)``, items being dicts for src.utils.serializer.json_response;
+    see keyset_page for the headers.
+    """
+    serializer = patient_serializer(page_args.fields)
+    columns = list(serializer.columns)
+    if sort_column.key not in {column.key for column in columns}:
+        columns.append(sort_column)
+    query = db.session.query(*columns)
+
+    if criteria:
+        query = query.filter(*criteria)
+
+    rows, headers = keyset_page(query, page_args, sort_column, Patient.id)
+    return serializer.to_dicts(rows), headers
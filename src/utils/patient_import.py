@@ -0,0 +1,198 @@
+"""Bulk patient import (POST /api/patients/import and ``import-patients``).
+
+Records are read one at a time from a CSV or NDJSON stream and checked
+with patient_values(), the same rules create_patient applies. Valid rows
+are inserted BATCH_SIZE at a time with one executemany INSERT per
+transaction; the patients triggers keep the dashboard counters, the search
+index and the change feed up to date as usual. A bad record is reported
+with its line number and skipped, and never costs the rest of its batch.
+The stream is decoded as it is read, so bytes that are not UTF-8 stop the
+import where they are found; batches before them stay imported.
+"""
+import csv
+from datetime import datetime
+import io
+import json
+import time
+
+from src.models.patient import Patient
+from src.models.user import db
+
+BATCH_SIZE = 1000
+# Per-row errors returned in the summary; the rest are only counted
+MAX_REPORTED_ERRORS = 100
+
+IMPORT_FORMATS = ('ndjson', 'csv')
+
+REQUIRED_FIELDS = ('first_name', 'last_name', 'date_of_birth', 'gender', 'parent_name', 'phone')
+OPTIONAL_TEXT_FIELDS = ('city', 'area', 'street', 'apartment', 'blood_type')
+
+
+def _text(data, field):
+    value = data.get(field)
+    if value is None:
+        return ''
+    if not isinstance(value, str):
+        raise ValueError(f'{field} must be a string')
+    return value.strip()
+
+
+def patient_values(data):
+    """Validate a new patient record and return its column values.
+
+    Raises ValueError with a message for the client if the record is
+    invalid. Visit fields are never taken from the record: a new patient
+    is registered, not queued.
+    """
+    if not isinstance(data, dict):
+        raise ValueError('Expected a JSON object')
+    for field in REQUIRED_FIELDS:
+        if field not in data or not data[field]:
+            raise ValueError(f'Missing required field: {field}')
+
+    try:
+        date_of_birth = datetime.strptime(data['date_of_birth'], '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        raise ValueError('Invalid date format. UseYYYY-MM-DD')
+
+    # Allergies: a list is stored as a JSON string
+    allergies = data.get('allergies')
+    if isinstance(allergies, list):
+        allergies = json.dumps(allergies)
+    elif isinstance(allergies, str):
+        allergies = allergies.strip()
+    else:
+        allergies = None
+
+    medical_history = data.get('medical_history')
+    medical_history = medical_history.strip() if isinstance(medical_history, str) else None
+
+    values = {field: _text(data, field) for field in REQUIRED_FIELDS if field != 'date_of_birth'}
+    values.update((field, _text(data, field)) for field in OPTIONAL_TEXT_FIELDS)
+    values.update(
+        date_of_birth=date_of_birth,
+        gender=data['gender'],
+        patient_phone=_text(data, 'patient_phone') or None,
+        allergies=allergies,
+        medical_history=medical_history,
+        visit_datetime=None,
+        visit_type=None,
+        hall_status='Out',
+        doctor_comments=None,
+        status='registered',
+    )
+    return values
+
+
+def _ndjson_records(lines):
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            yield number, json.loads(line)
+        except ValueError as e:
+            yield number, ValueError(f'Invalid JSON: {e}')
+
+
+def _csv_records(lines):
+    reader = csv.DictReader(lines)
+    for record in reader:
+        # Empty cells mean "not given", as a missing key does in JSON
+        yield reader.line_num, {key: value for key, value in record.items() if key and value != ''}
+
+
+def read_records(stream, output):
+    """(line number, record) pairs from a binary stream of CSV or NDJSON.
+
+    A record that cannot be parsed comes through as a ValueError; bytes
+    that are not UTF-8 raise UnicodeDecodeError when they are reached.
+    """
+    # utf-8-sig drops the byte order mark the CSV export writes
+    lines = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='' if output == 'csv' else None)
+    return _csv_records(lines) if output == 'csv' else _ndjson_records(lines)
+
+
+class ImportResult:
+    """Counts, per-row errors and throughput of one import"""
+
+    def __init__(self):
+        self.imported = 0
+        self.failed = 0
+        self.errors = []
+        self.error = None  # why the import stopped early, if it did
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+
+    def add_error(self, line, error):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line, 'error': str(error)})
+
+    @property
+    def rows_per_second(self):
+        return self.imported / self.elapsed if self.elapsed else 0.0
+
+    def to_dict(self):
+        summary = {'error': self.error} if self.error else {}
+        return summary | {
+            'imported': self.imported,
+            'failed': self.failed,
+            'errors': self.errors,
+            'errors_truncated': self.failed > len(self.errors),
+            'seconds': round(self.elapsed, 3),
+            'rows_per_second': round(self.rows_per_second, 1),
+        }
+
+
+def _insert_batch(batch, result):
+    insert = db.insert(Patient.__table__)
+    try:
+        db.session.execute(insert, [values for _, values in batch])
+        db.session.commit()
+        result.imported += len(batch)
+        return
+    except Exception:
+        db.session.rollback()
+
+    # Something in the batch was refused: insert row by row to find out what
+    for line, values in batch:
+        try:
+            with db.session.begin_nested():
+                db.session.execute(insert, values)
+            result.imported += 1
+        except Exception as e:
+            result.add_error(line, e)
+    db.session.commit()
+
+
+def import_patients(records, batch_size=BATCH_SIZE):
+    """Validate and insert (line number, record) pairs; returns an ImportResult"""
+    result = ImportResult()
+    batch = []
+    records = iter(records)
+    while True:
+        try:
+            line, record = next(records)
+        except StopIteration:
+            break
+        except UnicodeDecodeError as e:
+            result.error = f'File is not valid UTF-8 ({e.reason}); the import stopped there'
+            batch = []
+            break
+        try:
+            if isinstance(record, Exception):
+                raise record
+            values = patient_values(record)
+        except ValueError as e:
+            result.add_error(line, e)
+            continue
+        # Core inserts skip the ORM event that fills the search keys
+        values.update(Patient.search_keys(values['first_name'], values['last_name'], values['parent_name']))
+        batch.append((line, values))
+        if len(batch) >= batch_size:
+            _insert_batch(batch, result)
+            batch = []
+    if batch:
+        _insert_batch(batch, result)
+    result.elapsed = time.perf_counter() - result.started
+    return result
@@ -0,0 +1,147 @@
+"""Disk-backed LRU cache for rendered report PDFs.
+
+Entries are addressed by a digest of everything a report's bytes depend
+on: report kind, patient id and updated_at, clinic config updated_at, the
+template version and the date printed on the report. A changed patient
+therefore never hits a stale entry; the routes that modify patients or the
+clinic config also delete that patient's (or every) entry so the space is
+freed straight away. The digest doubles as the response ETag.
+
+Files are named "<patient id>-<kind>-<digest>.pdf". Recency is the file
+mtime, refreshed on every hit. Each process keeps an estimate of the
+directory size, taken from its last scan plus what it has written since;
+only when that passes REPORT_CACHE_MAX_BYTES is the directory scanned and
+the oldest files evicted, down to EVICT_TO of the cap, so a put does not
+stat every entry. Writes by other processes are only seen at the next
+scan, so the directory can overshoot the cap by about the headroom of each
+other process.
+"""
+from datetime import date
+import glob
+import hashlib
+import os
+import tempfile
+import threading
+
+from flask import current_app
+
+DEFAULT_MAX_BYTES = 200 * 1024 * 1024
+# An eviction scan frees space down to this share of the cap, so the next
+# one is only due after that much more has been written
+EVICT_TO = 0.9
+
+# Bump when the report layout (src/utils/reports.py, report_templates.py)
+# changes, so cached renders are not reused
+TEMPLATE_VERSION = 2
+
+
+class ReportCache:
+
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._estimated_bytes = None  # unknown until the first scan
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(kind, patient_id, patient_updated_at, config_updated_at):
+        """Digest identifying one rendering of a report"""
+        parts = [
+            kind, patient_id, patient_updated_at, config_updated_at,
+            TEMPLATE_VERSION, date.today()
+        ]
+        digest = hashlib.sha256('|'.join(map(str, parts)).encode()).hexdigest()[:32]
+        return f'{patient_id}-{kind}-{digest}'
+
+    def _path(self, key):
+        return os.path.join(self.directory, f'{key}.pdf')
+
+    def get(self, key):
+        """Path of the cached PDF for key, or None on a miss"""
+        path = self._path(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def read(self, key):
+        """Cached PDF bytes for key, or None on a miss"""
+        path = self.get(key)
+        if path is None:
+            return None
+        try:
+            with open(path, 'rb') as pdf_file:
+                return pdf_file.read()
+        except FileNotFoundError:  # evicted in between
+            return None
+
+    def put(self, key, data):
+        """Store PDF bytes under key, evict old entries and return the path"""
+        path = self._path(key)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as tmp_file:
+            tmp_file.write(data)
+        os.replace(tmp_path, path)
+        with self._lock:
+            if self._estimated_bytes is not None:
+                self._estimated_bytes += len(data)
+            if self._estimated_bytes is None or self._estimated_bytes > self.max_bytes:
+                self._estimated_bytes = self._evict(keep=path)
+        return path
+
+    def _evict(self, keep):
+        """Scan the directory, evict the oldest files beyond EVICT_TO of the cap, return the size left"""
+        entries = []
+        total = 0
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith('.pdf'):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total += stat.st_size
+
+        if total <= self.max_bytes:
+            return total
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes * EVICT_TO:
+                break
+            if path == keep:
+                continue
+            self._remove(path)
+            total -= size
+        return total
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def invalidate_patient(self, patient_id):
+        """Drop every cached report of one patient"""
+        for path in glob.glob(os.path.join(self.directory, f'{patient_id}-*.pdf')):
+            self._remove(path)
+
+    def clear(self):
+        """Drop every cached report"""
+        for path in glob.glob(os.path.join(self.directory, '*.pdf')):
+            self._remove(path)
+        with self._lock:
+            self._estimated_bytes = None
+
+
+def get_report_cache():
+    """The current app's report cache, created on first use"""
+    cache = current_app.extensions.get('report_cache')
+    if cache is None:
+        cache = current_app.extensions['report_cache'] = ReportCache(
+            current_app.config['REPORT_CACHE_DIR'],
+            current_app.config.get('REPORT_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES)
+        )
+    return cache
@@ -0,0 +1,194 @@
+"""Background report jobs, queued in the report_jobs table.
+
+An async report request only inserts a queued ReportJob. A few worker
+threads in each app process (REPORT_JOB_THREADS) claim the oldest queued job
+with a single UPDATE ... RETURNING, so every job goes to exactly one worker
+even with several server processes, and hand the rendering to the report
+process pool, so request threads are never held up by ReportLab. Idle
+workers look for work with a plain SELECT first, so polling never takes
+the SQLite write lock while the queue is empty. Finished PDFs stay in
+REPORT_JOB_DIR until the job expires (REPORT_JOB_TTL seconds), and the
+oldest results are dropped early when they outgrow REPORT_JOB_MAX_BYTES.
+"""
+from datetime import datetime, timedelta
+import os
+import tempfile
+import threading
+import time
+
+from flask import current_app
+
+from src.models.patient import Patient
+from src.models.report_job import ReportJob
+from src.models.user import db
+from src.utils.config_cache import clinic_config
+from src.utils.report_cache import get_report_cache
+from src.utils.report_pool import render_in_pool
+from src.utils.visits import visit_history
+
+DEFAULT_TTL = 3600
+DEFAULT_MAX_BYTES = 100 * 1024 * 1024
+
+# Claiming threads per process; they only wait on the report pool, which
+# does the rendering
+DEFAULT_THREADS = 2
+# How often idle workers look for jobs queued by other processes
+POLL_INTERVAL = 2
+# A job still running after this long is assumed lost with its process
+STALE_AFTER = timedelta(minutes=10)
+
+_wakeup = threading.Event()
+_workers_lock = threading.Lock()
+_workers_pid = None
+
+
+def result_path(job_id):
+    return os.path.join(current_app.config['REPORT_JOB_DIR'], f'{job_id}.pdf')
+
+
+def enqueue_report_job(kind, patient_id):
+    """Queue a report job. The caller commits, then calls start_report_workers."""
+    if kind not in ReportJob.KINDS:
+        raise ValueError(f'Unknown report kind: {kind}')
+    job = ReportJob(kind=kind, patient_id=patient_id)
+    db.session.add(job)
+    return job
+
+
+def queue_position(job):
+    """Number of queued jobs ahead of this one"""
+    return ReportJob.query.filter(
+        ReportJob.status == 'queued',
+        ReportJob.created_at < job.created_at
+    ).count()
+
+
+def start_report_workers():
+    """Start this process's worker threads if needed, and wake them"""
+    global _workers_pid
+    with _workers_lock:
+        if _workers_pid != os.getpid():
+            app = current_app._get_current_object()
+            os.makedirs(app.config['REPORT_JOB_DIR'], exist_ok=True)
+            for number in range(app.config.get('REPORT_JOB_THREADS') or DEFAULT_THREADS):
+                threading.Thread(
+                    target=_work, args=(app,), name=f'report-job-worker-{number}', daemon=True
+                ).start()
+            _workers_pid = os.getpid()
+    _wakeup.set()
+
+
+def _claim_next_job():
+    now = datetime.utcnow()
+    claimable = db.or_(
+        ReportJob.status == 'queued',
+        db.and_(ReportJob.status == 'running', ReportJob.started_at < now - STALE_AFTER)
+    )
+    # A read first: the UPDATE would take the write lock even with nothing to claim
+    if db.session.execute(db.select(ReportJob.id).where(claimable).limit(1)).first() is None:
+        db.session.commit()
+        return None
+
+    next_job = db.select(ReportJob.id).where(claimable).order_by(ReportJob.created_at).limit(1).scalar_subquery()
+    job_id = db.session.execute(
+        db.update(ReportJob)
+        .where(ReportJob.id == next_job)
+        .values(status='running', started_at=now)
+        .returning(ReportJob.id)
+    ).scalar()
+    db.session.commit()
+    return db.session.get(ReportJob, job_id) if job_id else None
+
+
+def _run_job(job):
+    from src.utils.reports import render_history_report, render_patient_report
+    
+    patient = db.session.get(Patient, job.patient_id)
+    if patient is None:
+        raise LookupError('Patient not found')
+
+    # Share renders with the synchronous report routes
+    cache = get_report_cache()
+    clinic = clinic_config()
+    key = cache.key(job.kind, patient.id, patient.updated_at, clinic['updated_at'])
+    pdf = cache.read(key)
+    if pdf is None:
+        if job.kind == 'history':
+            pdf = render_in_pool(job.kind, render_history_report, patient, visit_history(patient.id), clinic)
+        else:
+            pdf = render_in_pool(job.kind, render_patient_report, patient, clinic)
+        cache.put(key, pdf)
+
+    path = result_path(job.id)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    with os.fdopen(fd, 'wb') as tmp_file:
+        tmp_file.write(pdf)
+    os.replace(tmp_path, path)
+    job.status = 'done'
+    job.result_size = len(pdf)
+
+
+def _finish(job, now):
+    job.finished_at = now
+    job.expires_at = now + timedelta(seconds=current_app.config.get('REPORT_JOB_TTL', DEFAULT_TTL))
+
+
+def _work(app):
+    with app.app_context():
+        while True:
+            try:
+                job = _claim_next_job()
+                if job is None:
+                    purge_job_results()
+                    db.session.commit()
+                    _wakeup.wait(POLL_INTERVAL)
+                    _wakeup.clear()
+                    continue
+
+                try:
+                    _run_job(job)
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"Error in report job {job.id}: {e}")
+                    job.status = 'failed'
+                    job.error = str(e)
+                _finish(job, datetime.utcnow())
+                db.session.commit()
+                purge_job_results()
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                print(f"Error in report job worker: {e}")
+                time.sleep(POLL_INTERVAL)
+
+
+def purge_job_results():
+    """Delete expired jobs, then the oldest results beyond the disk quota.
+
+    Returns the number of jobs deleted. The caller commits.
+    """
+    now = datetime.utcnow()
+    doomed = db.session.execute(
+        db.select(ReportJob.id).where(ReportJob.expires_at < now)
+    ).scalars().all()
+
+    stored = db.session.execute(
+        db.select(ReportJob.id, ReportJob.result_size)
+        .where(ReportJob.status == 'done', ReportJob.expires_at >= now)
+        .order_by(ReportJob.finished_at.desc())
+    ).all()
+    max_bytes = current_app.config.get('REPORT_JOB_MAX_BYTES', DEFAULT_MAX_BYTES)
+    total = 0
+    for job_id, size in stored:
+        total += size or 0
+        if total > max_bytes:
+            doomed.append(job_id)
+
+    if doomed:
+        db.session.execute(db.delete(ReportJob).where(ReportJob.id.in_(doomed)))
+        for job_id in doomed:
+            try:
+                os.remove(result_path(job_id))
+            except FileNotFoundError:
+                pass
+    return len(doomed)
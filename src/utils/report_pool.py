@@ -0,0 +1,127 @@
+"""Rendering report PDFs in a pool of worker processes.
+
+ReportLab layout is pure Python, so reports rendered in request threads
+take turns on the GIL. Batch rendering hands the (already loaded) patients
+to a process pool instead. Workers only run the render functions; they
+never touch the database.
+
+The app process runs request and job threads, and forking a threaded
+process can copy locks that another thread holds. So workers are started
+from a forkserver, a small single-threaded process that has only
+ReportLab and the render code loaded, or with spawn where there is no
+forkserver (Windows).
+"""
+from concurrent.futures import ProcessPoolExecutor
+import io
+import itertools
+import multiprocessing
+import os
+import time
+import zipfile
+
+from flask import current_app
+
+from src.utils.metrics import observe_render
+
+# Patients per batch request; larger print runs are split by the client
+MAX_BATCH_REPORTS = 500
+
+_pool = None
+_pool_pid = None
+
+
+def _pool_context():
+    if 'forkserver' not in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('spawn')
+    context = multiprocessing.get_context('forkserver')
+    # Loaded once in the server, so every worker starts with them
+    context.set_forkserver_preload(['src.models.patient', 'src.utils.reports'])
+    return context
+
+
+def create_report_pool(max_workers):
+    """A new report pool of max_workers processes (see get_report_pool)"""
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=_pool_context())
+
+
+def get_report_pool():
+    """This process's report pool, created on first use.
+
+    A pool inherited through a pre-fork server is not usable in the child,
+    so each process creates its own.
+    """
+    global _pool, _pool_pid
+    if _pool is None or _pool_pid != os.getpid():
+        _pool = create_report_pool(current_app.config.get('REPORT_WORKERS') or os.cpu_count())
+        _pool_pid = os.getpid()
+    return _pool
+
+
+def _timed_render(render, *args):
+    # Runs in the worker process; the caller records the time in its own
+    start = time.perf_counter()
+    pdf = render(*args)
+    return time.perf_counter() - start, pdf
+
+
+def _observed(kind, results):
+    for seconds, pdf in results:
+        observe_render(kind, seconds)
+        yield pdf
+
+
+def render_reports(patients, clinic):
+    """Render each patient's report in the pool; yields PDF bytes in order"""
+    from src.utils.reports import render_patient_report
+    results = get_report_pool().map(_timed_render, itertools.repeat(render_patient_report), patients, itertools.repeat(clinic))
+    return _observed('report', results)
+
+
+def render_in_pool(kind, render, *args):
+    """Run one render function in a worker process and return its PDF bytes.
+
+    The render time is recorded under the report kind (see src/utils/metrics.py).
+    """
+    seconds, pdf = get_report_pool().submit(_timed_render, render, *args).result()
+    observe_render(kind, seconds)
+    return pdf
+
+
+def render_merged_report(patients, clinic):
+    """Render all the reports into one PDF in a worker process"""
+    from src.utils.reports import render_patient_reports
+    return render_in_pool('merged', render_patient_reports, patients, clinic)
+
+
+class _ZipStream(io.RawIOBase):
+    """Write-only sink that hands written bytes back to a generator"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def iter_zip(named_files):
+    """Stream a ZIP archive of (filename, bytes) pairs as they are produced.
+
+    The sink cannot seek, so zipfile writes each entry followed by a data
+    descriptor and every entry can be sent as soon as it is written.
+    PDFs are already compressed, so entries are stored.
+    """
+    stream = _ZipStream()
+    with zipfile.ZipFile(stream, 'w', zipfile.ZIP_STORED) as archive:
+        for name, data in named_files:
+            archive.writestr(name, data)
+            yield stream.drain()
+    yield stream.drain()
@@ -0,0 +1,140 @@
+"""ReportLab styles, table styles and static flowables for the PDF reports.
+
+build_templates() builds one ReportTemplates. The module builds the set
+every report shares when it is first imported (by the first report a
+process renders; see src/utils/reports.py), and the render functions take
+another set only when they are given one. Flowables carry per-build layout
+state, so reports take copies of the static ones (copy.copy keeps the
+already-parsed paragraph text) instead of the shared instances.
+"""
+import copy
+from xml.sax.saxutils import escape
+
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import inch
+from reportlab.platypus import Paragraph, Spacer, TableStyle
+
+PAGE_SIZE = A4
+PAGE_MARGINS = {'rightMargin': 72, 'leftMargin': 72, 'topMargin': 72, 'bottomMargin': 18}
+INFO_COLUMN_WIDTHS = [2*inch, 4*inch]
+
+
+def _info_table_style(label_background):
+    return TableStyle([
+        ('BACKGROUND', (0, 0), (0, -1), colors.HexColor(label_background)),
+        ('TEXTCOLOR', (0, 0), (0, -1), colors.HexColor('#4a5568')),
+        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+        ('FONTNAME', (1, 0), (1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 0), (-1, -1), 11),
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+        ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#e2e8f0')),
+        ('ROWBACKGROUNDS', (0, 0), (-1, -1), [colors.white, colors.HexColor('#f8f9fa')])
+    ])
+
+
+class ReportTemplates:
+    """Paragraph and table styles, static flowables and cached headings of the reports"""
+
+    def __init__(self):
+        sample_styles = getSampleStyleSheet()
+
+        self.title_style = ParagraphStyle(
+            'CustomTitle',
+            parent=sample_styles['Heading1'],
+            fontSize=24,
+            spaceAfter=30,
+            alignment=TA_CENTER,
+            textColor=colors.HexColor('#4a5568')
+        )
+
+        self.header_style = ParagraphStyle(
+            'CustomHeader',
+            parent=sample_styles['Heading2'],
+            fontSize=16,
+            spaceAfter=12,
+            textColor=colors.HexColor('#667eea')
+        )
+
+        self.normal_style = ParagraphStyle(
+            'CustomNormal',
+            parent=sample_styles['Normal'],
+            fontSize=12,
+            spaceAfter=6
+        )
+
+        self.footer_style = ParagraphStyle(
+            'Footer',
+            parent=sample_styles['Normal'],
+            fontSize=10,
+            alignment=TA_CENTER,
+            textColor=colors.HexColor('#718096')
+        )
+
+        self.patient_table_style = _info_table_style('#f7fafc')
+        self.visit_table_style = _info_table_style('#f0f8ff')
+
+        self._static_flowables = {
+            'patient_report_header': [
+                Paragraph("🏥 PEDIATRIC PATIENT REPORT", self.title_style),
+                Spacer(1, 20),
+                Paragraph("Patient Information", self.header_style),
+            ],
+            'history_report_header': [
+                Paragraph("🏥 PATIENT HISTORY REPORT", self.title_style),
+                Spacer(1, 20),
+                Paragraph("Patient Information", self.header_style),
+            ],
+            'visit_history_heading': [
+                Paragraph("Visit History", self.header_style),
+            ],
+            'no_visit_history': [
+                Paragraph("No visit history recorded.", self.normal_style),
+                Spacer(1, 15),
+            ],
+            'generated_by': [
+                Paragraph("Generated by Pediatric Doctor Management System", self.footer_style),
+            ],
+        }
+
+        self._section_headings = {}
+        self._clinic_footer = (None, [])  # (clinic details, flowables) of the last footer built
+
+    def static_flowables(self, name):
+        """Fresh copies of a named group of static flowables"""
+        return [copy.copy(flowable) for flowable in self._static_flowables[name]]
+
+    def clinic_footer(self, clinic):
+        """Copies of the footer naming the doctor and clinic, from a ClinicConfig.to_dict()"""
+        details = (clinic['doctor_name'], clinic['clinic_name'], clinic['clinic_phone'])
+        if self._clinic_footer[0] != details:
+            doctor_name, clinic_name, clinic_phone = (escape(value or '') for value in details)
+            self._clinic_footer = (details, [
+                Paragraph(f"{doctor_name} - {clinic_name}", self.footer_style),
+                Paragraph(f"Clinic Phone: {clinic_phone}", self.footer_style),
+                Spacer(1, 10),
+            ])
+        return [copy.copy(flowable) for flowable in self._clinic_footer[1]]
+
+    def section_heading(self, title):
+        """A copy of the (cached) heading paragraph for a report section"""
+        heading = self._section_headings.get(title)
+        if heading is None:
+            heading = self._section_headings[title] = Paragraph(title, self.header_style)
+        return copy.copy(heading)
+
+
+def build_templates():
+    """Build a new set of report templates"""
+    return ReportTemplates()
+
+
+_shared_templates = build_templates()
+
+
+def shared_templates():
+    """The templates every report uses unless it is given its own"""
+    return _shared_templates
@@ -0,0 +1,168 @@
+"""PDF rendering for the patient and patient-history reports.
+
+Importing this module loads ReportLab, which takes a good share of the
+app's startup time and memory, so the code that renders reports imports
+it where it is used rather than at the top of the module.
+"""
+from datetime import date
+import io
+import json
+
+from reportlab.platypus import PageBreak, SimpleDocTemplate, Paragraph, Spacer, Table
+
+from src.utils.report_templates import INFO_COLUMN_WIDTHS, PAGE_MARGINS, PAGE_SIZE, shared_templates
+
+
+def _age(date_of_birth, today):
+    return today.year - date_of_birth.year - ((today.month, today.day) < (date_of_birth.month, date_of_birth.day))
+
+
+def _info_table(rows, style):
+    table = Table(rows, colWidths=INFO_COLUMN_WIDTHS)
+    table.setStyle(style)
+    return table
+
+
+def _section(story, templates, title, text):
+    story.append(templates.section_heading(title))
+    story.append(Paragraph(text, templates.normal_style))
+    story.append(Spacer(1, 15))
+
+
+def _allergies_section(story, templates, allergies):
+    if not allergies:
+        return
+    try:
+        # Attempt to load as JSON, if it fails, treat as plain text
+        allergies_list = json.loads(allergies)
+        if allergies_list:
+            _section(story, templates, "Known Allergies", f"⚠️ {', '.join(allergies_list)}")
+    except (json.JSONDecodeError, TypeError):
+        if allergies.strip():
+            _section(story, templates, "Known Allergies", f"⚠️ {allergies}")
+
+
+def _build(story):
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=PAGE_SIZE, **PAGE_MARGINS)
+    doc.build(story)
+    return buffer.getvalue()
+
+
+def _patient_report_story(patient, clinic, today, templates):
+    story = templates.static_flowables('patient_report_header')
+
+    patient_data = [
+        ['Patient ID:', str(patient.id)],
+        ['Full Name:', f"{patient.first_name} {patient.last_name}"],
+        ['Date of Birth:', patient.date_of_birth.strftime('%B %d, %Y')],
+        ['Age:', f"{_age(patient.date_of_birth, today)} years old"],
+        ['Gender:', patient.gender],
+        ['Parent/Guardian:', patient.parent_name],
+        ['Phone Number:', patient.phone],
+    ]
+    full_address = patient.get_full_address()
+    if full_address:
+        patient_data.append(['Address:', full_address])
+    if patient.visit_type:
+        patient_data.append(['Visit Type:', patient.visit_type.title()])
+    if patient.visit_datetime:
+        patient_data.append(['Visit Date/Time:', patient.visit_datetime.strftime('%B %d, %Y at %I:%M %p')])
+    if patient.blood_type:
+        patient_data.append(['Blood Type:', patient.blood_type])
+
+    story.append(_info_table(patient_data, templates.patient_table_style))
+    story.append(Spacer(1, 20))
+
+    _allergies_section(story, templates, patient.allergies)
+    if patient.medical_history:
+        _section(story, templates, "Medical History", patient.medical_history)
+    if patient.doctor_comments:
+        _section(story, templates, "Doctor's Comments", patient.doctor_comments)
+    if patient.status:
+        status_text = patient.status.replace('_', ' ').title()
+        if patient.hall_status:
+            status_text += f" (Hall Status: {patient.hall_status})"
+        _section(story, templates, "Visit Status", status_text)
+
+    story.append(Spacer(1, 30))
+    story.extend(templates.clinic_footer(clinic))
+    story.extend(templates.static_flowables('generated_by'))
+    story.append(Paragraph(f"Report generated on: {today.strftime('%B %d, %Y')}", templates.footer_style))
+    return story
+
+
+def render_patient_report(patient, clinic, templates=None):
+    """Render the single-visit patient report and return the PDF bytes.
+
+    clinic is the ClinicConfig.to_dict() named in the footer; templates
+    defaults to the shared ones (see src/utils/report_templates.py).
+    """
+    return _build(_patient_report_story(patient, clinic, date.today(), templates or shared_templates()))
+
+
+def render_patient_reports(patients, clinic):
+    """Render the reports of several patients into one PDF, one report per page run"""
+    today = date.today()
+    templates = shared_templates()
+    story = []
+    for patient in patients:
+        if story:
+            story.append(PageBreak())
+        story.extend(_patient_report_story(patient, clinic, today, templates))
+    return _build(story)
+
+
+def render_history_report(patient, visits, clinic, templates=None):
+    """Render the patient history report (visits newest first) and return the PDF bytes"""
+    today = date.today()
+    templates = templates or shared_templates()
+    story = templates.static_flowables('history_report_header')
+
+    patient_data = [
+        ['Patient ID:', str(patient.id)],
+        ['Full Name:', f"{patient.first_name} {patient.last_name}"],
+        ['Date of Birth:', patient.date_of_birth.strftime('%B %d, %Y')],
+        ['Age:', f"{_age(patient.date_of_birth, today)} years old"],
+        ['Gender:', patient.gender],
+        ['Parent/Guardian:', patient.parent_name],
+        ['Parent Phone:', patient.phone],
+    ]
+    if patient.patient_phone:
+        patient_data.append(['Patient Phone:', patient.patient_phone])
+    full_address = patient.get_full_address()
+    if full_address:
+        patient_data.append(['Address:', full_address])
+    if patient.blood_type:
+        patient_data.append(['Blood Type:', patient.blood_type])
+
+    story.append(_info_table(patient_data, templates.patient_table_style))
+    story.append(Spacer(1, 20))
+
+    story.extend(templates.static_flowables('visit_history_heading'))
+    for visit in visits:
+        visit_data = [
+            ['Visit Date/Time:', visit.visit_datetime.strftime('%B %d, %Y at %I:%M %p') if visit.visit_datetime else 'Not specified'],
+            ['Visit Type:', visit.visit_type.title() if visit.visit_type else 'Not specified'],
+            ['Status:', visit.status.replace('_', ' ').title() if visit.status else 'Not specified'],
+            ['Hall Status:', visit.hall_status if visit.hall_status else 'Not specified']
+        ]
+        if visit.doctor_comments:
+            visit_data.append(['Doctor\'s Comments:', Paragraph(visit.doctor_comments, templates.normal_style)])
+        story.append(_info_table(visit_data, templates.visit_table_style))
+        story.append(Spacer(1, 15))
+    if not visits:
+        story.extend(templates.static_flowables('no_visit_history'))
+
+    _allergies_section(story, templates, patient.allergies)
+    if patient.medical_history:
+        _section(story, templates, "Medical History", patient.medical_history)
+    if patient.doctor_comments:
+        _section(story, templates, "Doctor's Comments & Medications", patient.doctor_comments)
+
+    story.append(Spacer(1, 30))
+    # Add doctor's name and clinic phone to footer
+    story.extend(templates.clinic_footer(clinic))
+    story.extend(templates.static_flowables('generated_by'))
+    story.append(Paragraph(f"Report generated on: {today.strftime('%B %d, %Y')}", templates.footer_style))
+    return _build(story)
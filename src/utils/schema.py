@@ -0,0 +1,86 @@
+"""Schema creation and upgrades, run by ``flask --app src.main upgrade-db``"""
+from src.models.clinic_config import ClinicConfig
+from src.models.user import db
+from src.utils.changes import install_change_feed
+from src.utils.search import backfill_search_keys, install_search_index
+from src.utils.statistics import install_counter_triggers
+from src.utils.visits import install_visit_sync, migrate_visit_columns
+
+
+def check_columns():
+    """Add model columns that are missing from existing tables.
+
+    db.create_all() never alters an existing table, so columns added to a
+    model later are created here with ALTER TABLE ... ADD COLUMN. Only
+    nullable columns without server defaults are supported, which is what
+    SQLite allows without a table rebuild.
+    Returns the added columns as "table.column" strings.
+    """
+    inspector = db.inspect(db.engine)
+    added = []
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            column_type = column.type.compile(dialect=db.engine.dialect)
+            print(f"Missing column {table.name}.{column.name}, adding it")
+            with db.engine.begin() as connection:
+                connection.execute(db.text(
+                    f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'
+                ))
+            added.append(f'{table.name}.{column.name}')
+    return added
+
+
+def check_indexes(create_missing=True):
+    """Report model indexes that are missing from the database.
+
+    db.create_all() only creates indexes together with new tables, so an
+    existing app.db never picks up indexes added to a model later. Missing
+    ones are printed and, unless create_missing is False, created.
+    Returns the names of the indexes that were missing.
+    """
+    inspector = db.inspect(db.engine)
+    missing = []
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        missing.extend(index for index in table.indexes if index.name not in existing)
+
+    for index in missing:
+        if create_missing:
+            print(f"Missing index {index.name} on {index.table.name}, creating it")
+            index.create(db.engine)
+        else:
+            print(f"Missing index {index.name} on {index.table.name}")
+    return [index.name for index in missing]
+
+
+def upgrade_schema():
+    """Bring the database up to date with the models.
+
+    Creates missing tables, columns and indexes, installs the triggers and
+    the search index, creates the default clinic config and migrates data
+    that moved between columns. Safe to run on every deploy. Servers do
+    not run it on startup; ``python src/main.py`` does, for development.
+    """
+    db.create_all()
+    added_columns = check_columns()
+    check_indexes()
+    install_counter_triggers()
+    install_search_index()
+    install_visit_sync()
+    install_change_feed()
+    # Left by an earlier version that tracked users.version; the column stays, unused
+    db.session.execute(db.text('DROP TRIGGER IF EXISTS trg_users_version'))
+    db.session.commit()
+    ClinicConfig.get_config()  # create the default row up front, not during a read
+    if 'patients.name_key' in added_columns:
+        print(f"Backfilled search keys for {backfill_search_keys()} patients")
+    if 'patients.current_visit_id' in added_columns:
+        print(f"Moved {migrate_visit_columns()} visits into the visits table")
+        db.session.commit()
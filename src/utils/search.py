@@ -0,0 +1,199 @@
+"""Full-text patient search backed by an SQLite FTS5 index.
+
+patients_fts is an external-content FTS5 table over the patients columns
+people search by: the normalized and phonetic name keys (see
+src/utils/names.py) and the phone numbers. Triggers keep it in step with
+inserts, updates and deletes, and ``flask --app src.main rebuild-search-index``
+regenerates it from scratch. If the SQLite build has no FTS5, searches fall
+back to an ILIKE scan.
+"""
+from sqlalchemy.exc import OperationalError
+
+from src.models.patient import Patient
+from src.models.user import db
+from src.utils.names import normalize_name, phonetic_key
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+# Indexed columns and their bm25 weights: a hit on the child's name ranks
+# above the parent's name, which ranks above a phone number, and a spelling
+# match ranks above a phonetic one.
+SEARCH_COLUMNS = (
+    ('name_key', 10.0),
+    ('parent_key', 5.0),
+    ('phone', 1.0),
+    ('patient_phone', 1.0),
+    ('name_phonetic', 4.0),
+    ('parent_phonetic', 2.0),
+)
+TEXT_COLUMNS = ('name_key', 'parent_key', 'phone', 'patient_phone')
+PHONETIC_COLUMNS = {'name_key': 'name_phonetic', 'parent_key': 'parent_phonetic'}
+
+BACKFILL_BATCH_SIZE = 1000
+
+_fts_enabled = None  # unknown until the first search, or install_search_index
+
+
+def _column_list(prefix=''):
+    return ', '.join(f'{prefix}{name}' for name, _ in SEARCH_COLUMNS)
+
+
+def _index_statements():
+    columns = _column_list()
+    return [
+        # M* keeps combining marks (e.g. Arabic harakat) inside tokens
+        # instead of splitting words on them.
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS patients_fts USING fts5("
+        f"{columns}, content='patients', content_rowid='id', prefix='2 3', "
+        f"tokenize=\"unicode61 remove_diacritics 2 categories 'L* N* Co M*'\")",
+        f"CREATE TRIGGER IF NOT EXISTS trg_patients_search_insert AFTER INSERT ON patients BEGIN "
+        f"INSERT INTO patients_fts (rowid, {columns}) VALUES (NEW.id, {_column_list('NEW.')}); END",
+        f"CREATE TRIGGER IF NOT EXISTS trg_patients_search_delete AFTER DELETE ON patients BEGIN "
+        f"INSERT INTO patients_fts (patients_fts, rowid, {columns}) "
+        f"VALUES ('delete', OLD.id, {_column_list('OLD.')}); END",
+        f"CREATE TRIGGER IF NOT EXISTS trg_patients_search_update AFTER UPDATE OF {columns} ON patients BEGIN "
+        f"INSERT INTO patients_fts (patients_fts, rowid, {columns}) "
+        f"VALUES ('delete', OLD.id, {_column_list('OLD.')}); "
+        f"INSERT INTO patients_fts (rowid, {columns}) VALUES (NEW.id, {_column_list('NEW.')}); END",
+    ]
+
+
+def _drop_outdated_index():
+    """Drop patients_fts and its triggers if its columns no longer match.
+
+    Returns True if an index with the current columns already exists.
+    """
+    existing = [row[1] for row in db.session.execute(db.text("PRAGMA table_info(patients_fts)"))]
+    if not existing:
+        return False
+    if existing == [name for name, _ in SEARCH_COLUMNS]:
+        return True
+    print("Search index columns changed, recreating patients_fts")
+    for action in ('insert', 'update', 'delete'):
+        db.session.execute(db.text(f"DROP TRIGGER IF EXISTS trg_patients_search_{action}"))
+    db.session.execute(db.text("DROP TABLE patients_fts"))
+    return False
+
+
+def install_search_index():
+    """Create the FTS index and its triggers, building it on first run"""
+    global _fts_enabled
+    try:
+        exists = _drop_outdated_index()
+        for statement in _index_statements():
+            db.session.execute(db.text(statement))
+        if not exists:
+            rebuild_search_index()
+        db.session.commit()
+        _fts_enabled = True
+    except OperationalError as e:
+        db.session.rollback()
+        print(f"Full-text search unavailable, using ILIKE search: {e}")
+        _fts_enabled = False
+
+
+def _search_index_exists():
+    """Whether patients_fts has been created (by ``upgrade-db``); checked once per process"""
+    global _fts_enabled
+    if _fts_enabled is None:
+        _fts_enabled = db.session.execute(db.text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'patients_fts'"
+        )).first() is not None
+    return _fts_enabled
+
+
+def rebuild_search_index():
+    """Regenerate patients_fts from the patients table. The caller commits."""
+    db.session.execute(db.text("INSERT INTO patients_fts (patients_fts) VALUES ('rebuild')"))
+
+
+def parse_limit(value):
+    """Clamp a ``limit`` query parameter to [1, MAX_LIMIT]"""
+    if value is None:
+        return DEFAULT_LIMIT
+    try:
+        limit = int(value)
+    except ValueError:
+        raise ValueError('limit must be an integer')
+    return max(1, min(limit, MAX_LIMIT))
+
+
+def backfill_search_keys(only_missing=True, batch_size=BACKFILL_BATCH_SIZE):
+    """Compute the name key columns for existing patients, in batches.
+
+    Each batch is one executemany UPDATE committed on its own; the search
+    triggers index the new keys as they are written. Returns the number of
+    rows updated.
+    """
+    query = db.session.query(Patient.id, Patient.first_name, Patient.last_name, Patient.parent_name)
+    if only_missing:
+        query = query.filter(Patient.name_key.is_(None))
+    update = db.update(Patient.__table__).where(
+        Patient.__table__.c.id == db.bindparam('row_id')
+    ).values(updated_at=Patient.__table__.c.updated_at)  # not a user edit
+
+    updated = 0
+    last_id = 0
+    while True:
+        rows = query.filter(Patient.id > last_id).order_by(Patient.id).limit(batch_size).all()
+        if not rows:
+            return updated
+        db.session.execute(update, [
+            {'row_id': row.id, **Patient.search_keys(row.first_name, row.last_name, row.parent_name)}
+            for row in rows
+        ])
+        db.session.commit()
+        updated += len(rows)
+        last_id = rows[-1].id
+
+
+def match_expression(text, columns=None):
+    """Turn free text into an FTS5 query.
+
+    Every word must match within ``columns`` (default: TEXT_COLUMNS), either
+    as a prefix of the normalized spelling or, for whole words typed with a
+    different spelling, by its exact phonetic code.
+    """
+    columns = columns or TEXT_COLUMNS
+    phonetic_columns = [PHONETIC_COLUMNS[name] for name in columns if name in PHONETIC_COLUMNS]
+    terms = []
+    for word in normalize_name(text).split():
+        alternatives = ['{%s} : "%s"*' % (' '.join(columns), word)]
+        code = phonetic_key(word)
+        if code and phonetic_columns:
+            alternatives.append('{%s} : "%s"' % (' '.join(phonetic_columns), code))
+        terms.append('(%s)' % ' OR '.join(alternatives))
+    return ' AND '.join(terms) or None
+
+
+def find_patients(text, columns=None, limit=DEFAULT_LIMIT):
+    """Return matching patients, best match first.
+
+    ``columns`` restricts the search to a subset of TEXT_COLUMNS; their
+    phonetic counterparts are searched along with them.
+    """
+    if not _search_index_exists():
+        return _ilike_search(text, columns, limit)
+
+    expression = match_expression(text, columns)
+    if expression is None:
+        return []
+    weights = ', '.join(str(weight) for _, weight in SEARCH_COLUMNS)
+    ids = db.session.execute(db.text(
+        f"SELECT rowid FROM patients_fts WHERE patients_fts MATCH :expression "
+        f"ORDER BY bm25(patients_fts, {weights}) LIMIT :limit"
+    ), {'expression': expression, 'limit': limit}).scalars().all()
+    if not ids:
+        return []
+    patients = {patient.id: patient for patient in Patient.query.filter(Patient.id.in_(ids))}
+    return [patients[patient_id] for patient_id in ids if patient_id in patients]
+
+
+def _ilike_search(text, columns, limit):
+    columns = columns or TEXT_COLUMNS
+    key = normalize_name(text)
+    return Patient.query.filter(db.or_(*(
+        getattr(Patient, name).ilike(f'%{key if name in PHONETIC_COLUMNS else text}%')
+        for name in columns
+    ))).order_by(Patient.created_at.desc()).limit(limit).all()
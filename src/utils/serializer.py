@@ -0,0 +1,89 @@
+"""Fast JSON for patient list responses.
+
+The list endpoints select plain column tuples instead of Patient objects
+and turn them into JSON with a serializer compiled once per field list:
+positional lookups into the row, full_address joined from its four columns,
+and dates left for the encoder. With orjson installed the encoder writes
+dates and datetimes natively (in the same format as isoformat()) straight
+to bytes; without it the standard library encoder is used. Either way keys
+are sorted as jsonify sorts them, so responses are identical in shape to
+the to_dict() + jsonify path.
+"""
+from datetime import date
+import json
+from operator import itemgetter
+
+from flask import current_app
+
+from src.models.patient import Patient
+
+try:
+    import orjson
+except ImportError:  # optional speedup, see requirements.txt
+    orjson = None
+
+
+def _isoformat(value):
+    if isinstance(value, date):  # date and datetime
+        return value.isoformat()
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+def dumps(data):
+    """Encode data as JSON bytes, keys sorted like jsonify"""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_SORT_KEYS)
+    return json.dumps(data, sort_keys=True, separators=(',', ':'), default=_isoformat).encode()
+
+
+def json_response(data, status=200, headers=None):
+    """A JSON response built with dumps() instead of jsonify"""
+    return current_app.response_class(dumps(data), status=status, headers=headers, mimetype='application/json')
+
+
+class PatientRowSerializer:
+    """Turns rows selected with .columns into dicts shaped like Patient.to_dict().
+
+    Only the requested fields are returned (plus id, see
+    Patient.columns_for_fields); the row may carry extra trailing columns.
+    """
+
+    def __init__(self, fields=Patient.API_FIELDS):
+        self.fields = tuple(fields)
+        self.columns = Patient.columns_for_fields(self.fields)
+        position = {column.key: index for index, column in enumerate(self.columns)}
+
+        self._plain_names = tuple(name for name in self.fields if name != 'full_address') or ('id',)
+        indexes = [position[name] for name in self._plain_names]
+        getter = itemgetter(*indexes)
+        self._plain_values = getter if len(indexes) > 1 else (lambda row: (getter(row),))
+        self._address_values = (
+            itemgetter(*(position[name] for name in Patient.ADDRESS_FIELDS))
+            if 'full_address' in self.fields else None
+        )
+
+    def to_dict(self, row):
+        result = dict(zip(self._plain_names, self._plain_values(row)))
+        if self._address_values is not None:
+            result['full_address'] = Patient.format_address(*self._address_values(row))
+        return result
+
+    def to_dicts(self, rows):
+        return [self.to_dict(row) for row in rows]
+
+
+# Field lists come from clients; past this many, new ones are not cached
+MAX_CACHED_SERIALIZERS = 64
+
+_serializers = {}
+
+
+def patient_serializer(fields=None):
+    """The (cached) serializer for a field list; all API fields by default"""
+    fields = tuple(fields) if fields else Patient.API_FIELDS
+    serializer = _serializers.get(fields)
+    if serializer is None:
+        serializer = PatientRowSerializer(fields)
+        if len(_serializers) < MAX_CACHED_SERIALIZERS:
+            _serializers[fields] = serializer
+    return serializer
@@ -0,0 +1,199 @@
+"""Dashboard statistics.
+
+/api/statistics reads materialized counters from the clinic_stats table.
+The counters are kept current by SQLite triggers on patients, so every
+write -- ORM, bulk UPDATE or raw SQL -- adjusts them in its own transaction.
+compute_statistics() derives the same payload straight from patients and
+is used to verify the counters (flask reconcile-stats).
+"""
+from datetime import date, datetime
+
+from src.models.clinic_stats import ClinicStat
+from src.models.patient import Patient
+from src.models.user import db
+
+# Counter dimensions: key prefix, the SQL expression (over a patients row
+# named {row}) whose value becomes the key suffix, and the column it reads.
+# Rows where the expression is NULL are not counted for that dimension.
+COUNTER_DIMENSIONS = (
+    ('visit_type', '{row}.visit_type', 'visit_type'),
+    ('hall_status', '{row}.hall_status', 'hall_status'),
+    ('status', '{row}.status', 'status'),
+    ('created_month', 'substr({row}.created_at, 1, 7)', 'created_at'),
+    ('visit_day', 'substr({row}.visit_datetime, 1, 10)', 'visit_datetime'),
+    ('dob', '{row}.date_of_birth', 'date_of_birth'),
+)
+
+_BUMP = """
+    INSERT INTO clinic_stats (key, value)
+    SELECT {key}, {delta} WHERE {condition}
+    ON CONFLICT(key) DO UPDATE SET value = value + excluded.value;"""
+
+
+def _key(prefix, expression, row):
+    return f"'{prefix}:' || {expression.format(row=row)}"
+
+
+def _trigger_statements():
+    """CREATE TRIGGER statements that keep clinic_stats in step with patients"""
+    on_insert = [_BUMP.format(key="'total'", delta=1, condition='1')]
+    on_delete = [_BUMP.format(key="'total'", delta=-1, condition='1')]
+    on_update = []
+    for prefix, expression, _ in COUNTER_DIMENSIONS:
+        new_value = expression.format(row='NEW')
+        old_value = expression.format(row='OLD')
+        on_insert.append(_BUMP.format(
+            key=_key(prefix, expression, 'NEW'), delta=1,
+            condition=f'{new_value} IS NOT NULL'
+        ))
+        on_delete.append(_BUMP.format(
+            key=_key(prefix, expression, 'OLD'), delta=-1,
+            condition=f'{old_value} IS NOT NULL'
+        ))
+        on_update.append(_BUMP.format(
+            key=_key(prefix, expression, 'OLD'), delta=-1,
+            condition=f'{old_value} IS NOT NULL AND {old_value} IS NOT {new_value}'
+        ))
+        on_update.append(_BUMP.format(
+            key=_key(prefix, expression, 'NEW'), delta=1,
+            condition=f'{new_value} IS NOT NULL AND {old_value} IS NOT {new_value}'
+        ))
+    watched = ', '.join(column for _, _, column in COUNTER_DIMENSIONS)
+    return [
+        'CREATE TRIGGER IF NOT EXISTS trg_patients_stats_insert AFTER INSERT ON patients '
+        f"BEGIN{''.join(on_insert)}\nEND",
+        f'CREATE TRIGGER IF NOT EXISTS trg_patients_stats_update AFTER UPDATE OF {watched} ON patients '
+        f"BEGIN{''.join(on_update)}\nEND",
+        'CREATE TRIGGER IF NOT EXISTS trg_patients_stats_delete AFTER DELETE ON patients '
+        f"BEGIN{''.join(on_delete)}\nEND",
+    ]
+
+
+def install_counter_triggers():
+    """Create the counter triggers and seed clinic_stats on first run"""
+    for statement in _trigger_statements():
+        db.session.execute(db.text(statement))
+    if ClinicStat.query.first() is None:
+        rebuild_counters()
+    db.session.commit()
+
+
+def expected_counters():
+    """Counter values recomputed from the patients table"""
+    selects = ["SELECT 'total' AS key, count(*) AS value FROM patients"]
+    for prefix, expression, _ in COUNTER_DIMENSIONS:
+        value = expression.format(row='patients')
+        selects.append(
+            f"SELECT {_key(prefix, expression, 'patients')}, count(*) FROM patients "
+            f"WHERE {value} IS NOT NULL GROUP BY {value}"
+        )
+    rows = db.session.execute(db.text(' UNION ALL '.join(selects))).all()
+    return {key: value for key, value in rows if value}
+
+
+def rebuild_counters():
+    """Rewrite clinic_stats from patients.
+
+    Returns the drift found as {key: (stored, expected)}. The caller commits.
+    """
+    stored = {stat.key: stat.value for stat in ClinicStat.query.all() if stat.value}
+    expected = expected_counters()
+    drift = {
+        key: (stored.get(key, 0), expected.get(key, 0))
+        for key in stored.keys() | expected.keys()
+        if stored.get(key, 0) != expected.get(key, 0)
+    }
+    ClinicStat.query.delete()
+    db.session.add_all(ClinicStat(key=key, value=value) for key, value in expected.items())
+    return drift
+
+
+def read_statistics(now=None):
+    """Return the /api/statistics payload from the clinic_stats counters"""
+    now = now or datetime.now()
+    today = now.date()
+    month_key = f'created_month:{now.year:04d}-{now.month:02d}'
+    day_key = f'visit_day:{today.isoformat()}'
+    keys = [
+        'total', month_key, day_key,
+        'visit_type:examination', 'visit_type:fast examination', 'visit_type:consultation',
+        'hall_status:In', 'status:finished',
+    ]
+    counters = dict(
+        db.session.query(ClinicStat.key, ClinicStat.value).filter(ClinicStat.key.in_(keys)).all()
+    )
+
+    # One counter per distinct birth date, so this is bounded by the age
+    # range of the practice rather than by the number of patients.
+    birth_dates = db.session.query(ClinicStat.key, ClinicStat.value).filter(
+        ClinicStat.key >= 'dob:', ClinicStat.key < 'dob;'
+    )
+    total_age = sum(
+        (today - date.fromisoformat(key[len('dob:'):])).days // 365 * value
+        for key, value in birth_dates
+    )
+    total_patients = counters.get('total', 0)
+
+    return {
+        'total_patients': total_patients,
+        'new_this_month': counters.get(month_key, 0),
+        'today_patients': counters.get(day_key, 0),
+        'average_age': total_age // total_patients if total_patients else 0,
+        'visit_types': {
+            'examination': counters.get('visit_type:examination', 0),
+            'fast_examination': counters.get('visit_type:fast examination', 0),
+            'consultation': counters.get('visit_type:consultation', 0)
+        },
+        'hall_status': {
+            'in_hall': counters.get('hall_status:In', 0),
+            'finished': counters.get('status:finished', 0)
+        }
+    }
+
+
+def _count_where(condition):
+    return db.func.coalesce(db.func.sum(db.case((condition, 1), else_=0)), 0)
+
+
+def compute_statistics(now=None):
+    """Return the /api/statistics payload from one pass over patients.
+
+    Ages use whole days // 365 per patient, averaged with integer division,
+    exactly as the dashboard has always shown them.
+    """
+    now = now or datetime.now()
+    today = now.date()
+    start_of_month = datetime(now.year, now.month, 1)
+
+    age_years = db.cast(
+        db.func.julianday(today.isoformat()) - db.func.julianday(Patient.date_of_birth),
+        db.Integer
+    ) // 365
+
+    row = db.session.query(
+        db.func.count(Patient.id).label('total_patients'),
+        _count_where(Patient.created_at >= start_of_month).label('new_this_month'),
+        _count_where(Patient.visit_on(today)).label('today_patients'),
+        db.func.coalesce(db.func.sum(age_years), 0).label('total_age'),
+        _count_where(Patient.visit_type == 'examination').label('examination'),
+        _count_where(Patient.visit_type == 'fast examination').label('fast_examination'),
+        _count_where(Patient.visit_type == 'consultation').label('consultation'),
+        _count_where(Patient.hall_status == 'In').label('in_hall'),
+        _count_where(Patient.status == 'finished').label('finished'),
+    ).one()
+
+    return {
+        'total_patients': row.total_patients,
+        'new_this_month': row.new_this_month,
+        'today_patients': row.today_patients,
+        'average_age': int(row.total_age) // row.total_patients if row.total_patients else 0,
+        'visit_types': {
+            'examination': row.examination,
+            'fast_examination': row.fast_examination,
+            'consultation': row.consultation
+        },
+        'hall_status': {
+            'in_hall': row.in_hall,
+            'finished': row.finished
+        }
+    }
@@ -0,0 +1,54 @@
+"""Cached identity and role of logged-in users.
+
+Auth checks run on every admin request and every SPA boot; instead of
+loading the User each time they read User.to_dict() from a small
+in-process cache, kept on flask.g for the rest of the request. Each entry
+is tagged with the user's version, which invalidate_user() bumps after
+update_user, delete_user, change_password and login commit, so a
+deactivated or demoted user loses access on their next request. An entry
+loaded from a read that raced with an invalidation carries the old version
+and is never served. Other server processes do not see the bump: there a
+change takes effect once their entry expires, at most USER_CACHE_TTL
+seconds later. Keep the TTL short; a hit costs no database query at all.
+"""
+import threading
+import time
+
+from flask import current_app, g, session
+
+from src.models.user import User, db
+
+DEFAULT_TTL = 5
+
+_entries = {}  # user id -> (version, expires, identity)
+_versions = {}  # user id -> version, bumped by invalidate_user
+_lock = threading.Lock()
+
+
+def cached_user(user_id):
+    """User.to_dict() for a user id, or None if there is no such user"""
+    version = _versions.get(user_id, 0)
+    entry = _entries.get(user_id)
+    if entry is not None and entry[0] == version and entry[1] > time.monotonic():
+        return entry[2]
+
+    user = db.session.get(User, user_id)
+    identity = user.to_dict() if user else None
+    ttl = current_app.config.get('USER_CACHE_TTL', DEFAULT_TTL)
+    _entries[user_id] = (version, time.monotonic() + ttl, identity)
+    return identity
+
+
+def invalidate_user(user_id):
+    """Drop the cached identity of a user whose row changed"""
+    with _lock:
+        _versions[user_id] = _versions.get(user_id, 0) + 1
+        _entries.pop(user_id, None)
+
+
+def current_user():
+    """The session user's cached identity (see cached_user), once per request"""
+    if 'current_user' not in g:
+        user_id = session.get('user_id')
+        g.current_user = cached_user(user_id) if user_id is not None else None
+    return g.current_user
@@ -0,0 +1,92 @@
+"""Visit history: keeping visits in step with the patient row, and migration.
+
+The queue screens still read the visit columns on patients, so those
+columns stay as a mirror of the patient's current visit. A trigger copies
+every change to them into the current Visit row in the same transaction,
+which covers the ORM routes and the set-based hall workflow UPDATEs alike.
+"""
+from src.models.patient import Patient
+from src.models.user import db
+from src.models.visit import Visit
+
+# Visits returned per patient by search-history; older ones are paged
+# through GET /patients/<id>/visits.
+HISTORY_VISIT_LIMIT = 20
+
+_SYNC_TRIGGER = """
+CREATE TRIGGER IF NOT EXISTS trg_patients_visit_sync
+AFTER UPDATE OF visit_datetime, visit_type, status, hall_status, doctor_comments ON patients
+WHEN NEW.current_visit_id IS NOT NULL AND NEW.current_visit_id IS OLD.current_visit_id
+BEGIN
+    UPDATE visits SET
+        visit_datetime = COALESCE(NEW.visit_datetime, visit_datetime),
+        visit_type = NEW.visit_type,
+        status = NEW.status,
+        hall_status = NEW.hall_status,
+        doctor_comments = NEW.doctor_comments,
+        updated_at = NEW.updated_at
+    WHERE id = NEW.current_visit_id;
+END"""
+
+
+def install_visit_sync():
+    """Create the trigger that mirrors patient visit columns into visits"""
+    db.session.execute(db.text(_SYNC_TRIGGER))
+    db.session.commit()
+
+
+def migrate_visit_columns():
+    """Copy visits recorded only on patient rows into the visits table.
+
+    Every patient with a visit_datetime but no current visit gets a Visit
+    built from its visit columns, which then becomes its current visit.
+    Returns the number of visits created. The caller commits.
+    """
+    pending = (Patient.visit_datetime.isnot(None), Patient.current_visit_id.is_(None))
+    created = db.session.execute(
+        db.insert(Visit).from_select(
+            ['patient_id', 'visit_datetime', 'visit_type', 'status', 'hall_status',
+             'doctor_comments', 'created_at', 'updated_at'],
+            db.select(
+                Patient.id, Patient.visit_datetime, Patient.visit_type, Patient.status,
+                Patient.hall_status, Patient.doctor_comments, Patient.updated_at, Patient.updated_at
+            ).where(*pending)
+        )
+    ).rowcount
+    db.session.execute(
+        db.update(Patient.__table__)
+        .where(*pending)
+        .values(
+            current_visit_id=db.select(db.func.max(Visit.id))
+            .where(Visit.patient_id == Patient.id)
+            .scalar_subquery(),
+            updated_at=Patient.updated_at  # not a user edit
+        )
+    )
+    return created
+
+
+def recent_visits(patient_ids, per_patient=HISTORY_VISIT_LIMIT):
+    """Latest visits of each patient, newest first, as {patient_id: [Visit]}"""
+    if not patient_ids:
+        return {}
+    position = db.func.row_number().over(
+        partition_by=Visit.patient_id,
+        order_by=(Visit.visit_datetime.desc(), Visit.id.desc())
+    ).label('position')
+    ranked = db.select(Visit.id, position).where(Visit.patient_id.in_(patient_ids)).subquery()
+    visits = Visit.query.join(ranked, ranked.c.id == Visit.id).filter(
+        ranked.c.position <= per_patient
+    ).order_by(Visit.patient_id, ranked.c.position)
+
+    history = {patient_id: [] for patient_id in patient_ids}
+    for visit in visits:
+        history[visit.patient_id].append(visit)
+    return history
+
+
+def visit_history(patient_id):
+    """Every visit of a patient, newest first"""
+    return Visit.query.filter_by(patient_id=patient_id).order_by(
+        Visit.visit_datetime.desc(), Visit.id.desc()
+    ).all()
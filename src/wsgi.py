@@ -0,0 +1,4 @@
+"""WSGI entry point for production servers (see gunicorn.conf.py)"""
+from src.main import create_app
+
+app = create_app()